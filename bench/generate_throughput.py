@@ -0,0 +1,130 @@
+import os
+
+os.environ.setdefault("TQDM_DISABLE", "1")  # read by tqdm at import
+
+from bench.mock_openai import MockParams, serve
+from generate import batch_request, parse_chat, summarize
+from lone_arena.config import Config, Model, Prompt
+
+import asyncio
+import argparse
+import json
+import multiprocessing
+import resource
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, w = await asyncio.open_connection("127.0.0.1", port)
+            w.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run_level(
+    port: int, concurrency: int, nprompt: int, sample: int, **kwargs
+) -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        model = Model(
+            name=f"mock-c{concurrency}",
+            concurrency=concurrency,
+            openai_params={
+                "base_url": f"http://127.0.0.1:{port}/v1",
+                "api_key": "mock",
+                "model": "mock",
+            },
+        )
+        conf = Config(
+            data_dir=Path(data_dir),
+            sample=sample,
+            model=[model],
+            prompt=[Prompt(f"p{i}", f"user: prompt {i}") for i in range(nprompt)],
+        )
+        prompts = {p.name: parse_chat(p.chat) for p in conf.prompt}  # as generate.py
+        ru0, t0 = resource.getrusage(resource.RUSAGE_SELF), time.perf_counter()
+        records = await batch_request(model, prompts, conf, **kwargs)
+        ru1, wall = resource.getrusage(resource.RUSAGE_SELF), time.perf_counter() - t0
+    cpu = ru1.ru_utime - ru0.ru_utime + ru1.ru_stime - ru0.ru_stime
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "samples": nprompt * sample,
+        "wall_s": round(wall, 3),
+        "req_per_s": round(len(records) / wall, 1),
+        "client_cpu_s": round(cpu, 3),
+        "client_cpu_ms_per_req": round(1000 * cpu / max(1, len(records)), 2),
+        "max_rss_mib": round(ru1.ru_maxrss / 1024, 1),
+        "summary": summarize(records),
+    }
+
+
+async def main():
+    argp = argparse.ArgumentParser(
+        description="Benchmark generate.py against a local mock endpoint"
+    )
+    argp.add_argument("--levels", type=str, default="1,4,16,64")
+    argp.add_argument("--prompts", type=int, default=32)
+    argp.add_argument("--sample", type=int, default=16)
+    argp.add_argument("--n-choices", type=int, default=1)
+    argp.add_argument("--stream", action="store_true")
+    argp.add_argument("--latency", type=float, default=0.2)
+    argp.add_argument("--token-rate", type=float, default=500.0)
+    argp.add_argument("--tokens", type=int, default=100)
+    argp.add_argument("--error-rate", type=float, default=0.0)
+    argp.add_argument("--capacity", type=int, default=None)
+    argp.add_argument("--output", type=str, help="save results as JSON")
+    args = argp.parse_args()
+
+    params = MockParams(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        capacity=args.capacity,
+    )
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(params, port), daemon=True)
+    server.start()
+    try:
+        await wait_ready(port)
+        results = []
+        for level in map(int, args.levels.split(",")):
+            r = await run_level(
+                port,
+                level,
+                args.prompts,
+                args.sample,
+                n_choices=args.n_choices,
+                stream=args.stream,
+            )
+            print(
+                f"concurrency {level:>4}: {r['req_per_s']:>7.1f} req/s, "
+                f"client CPU {r['client_cpu_ms_per_req']:.2f} ms/req, "
+                f"max RSS {r['max_rss_mib']:.0f} MiB | {r['summary']}"
+            )
+            results.append(r)
+    finally:
+        server.terminate()
+
+    if args.output:
+        with open(args.output, "w") as fo:
+            json.dump({"params": vars(args), "results": results}, fo, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+from attrs import define
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+import uvicorn
+
+import asyncio
+import argparse
+import json
+import random
+import time
+import uuid
+
+
+@define
+class MockParams:
+    latency: float = 0.2  # median time to first token
+    latency_sigma: float = 0.5  # of the lognormal latency distribution
+    token_rate: float = 50.0  # output tokens per second, per choice
+    tokens: int = 100  # mean output tokens
+    error_rate: float = 0.0  # fraction of 429 responses
+    server_error_rate: float = 0.0  # fraction of 500 responses
+    capacity: int | None = None  # 429 beyond this many requests in flight
+
+
+def make_app(params: MockParams) -> Starlette:
+    inflight = 0
+
+    def error(status: int, message: str) -> JSONResponse:
+        headers = {"retry-after": "0.1"} if status == 429 else None
+        return JSONResponse(
+            {"error": {"message": message, "type": "mock", "code": status}},
+            status_code=status,
+            headers=headers,
+        )
+
+    async def chat_completions(request: Request):
+        nonlocal inflight
+        body = await request.json()
+        n, model = body.get("n", 1), body.get("model", "mock")
+        r = random.random()
+        if r < params.error_rate:
+            return error(429, "rate limited")
+        if r < params.error_rate + params.server_error_rate:
+            return error(500, "internal error")
+        if params.capacity is not None and inflight >= params.capacity:
+            return error(429, "over capacity")
+
+        ttft = random.lognormvariate(0, params.latency_sigma) * params.latency
+        ntokens = [max(1, int(random.expovariate(1 / params.tokens))) for _ in range(n)]
+        cid, created = f"chatcmpl-{uuid.uuid4().hex}", int(time.time())
+        usage = {
+            "prompt_tokens": sum(len(m["content"]) // 4 for m in body["messages"]),
+            "completion_tokens": sum(ntokens),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            inflight += 1
+            try:
+                await asyncio.sleep(ttft + max(ntokens) / params.token_rate)
+            finally:
+                inflight -= 1
+            choices = [
+                {
+                    "index": i,
+                    "message": {"role": "assistant", "content": "lorem " * k},
+                    "finish_reason": "stop",
+                }
+                for i, k in enumerate(ntokens)
+            ]
+            return JSONResponse(
+                {
+                    "id": cid,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": choices,
+                    "usage": usage,
+                }
+            )
+
+        def chunk(choices: list, usage: dict | None = None) -> str:
+            d = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                "usage": usage,
+            }
+            return f"data: {json.dumps(d)}\n\n"
+
+        async def events():
+            nonlocal inflight
+            inflight += 1
+            try:
+                await asyncio.sleep(ttft)
+                for t in range(max(ntokens)):
+                    yield chunk(
+                        [
+                            {"index": i, "delta": {"content": "lorem "}}
+                            for i, k in enumerate(ntokens)
+                            if t < k
+                        ]
+                    )
+                    await asyncio.sleep(1 / params.token_rate)
+                if body.get("stream_options", {}).get("include_usage"):
+                    yield chunk([], usage)
+                yield "data: [DONE]\n\n"
+            finally:
+                inflight -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(
+        routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])]
+    )
+
+
+def serve(params: MockParams, port: int):
+    uvicorn.run(make_app(params), port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    argp = argparse.ArgumentParser(
+        description="Serve a stand-in OpenAI-compatible chat completion endpoint"
+    )
+    defaults = MockParams()
+    argp.add_argument("--port", type=int, default=8000)
+    argp.add_argument("--latency", type=float, default=defaults.latency)
+    argp.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    argp.add_argument("--token-rate", type=float, default=defaults.token_rate)
+    argp.add_argument("--tokens", type=int, default=defaults.tokens)
+    argp.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    argp.add_argument(
+        "--server-error-rate", type=float, default=defaults.server_error_rate
+    )
+    argp.add_argument("--capacity", type=int, default=None)
+    args = argp.parse_args()
+    port = args.__dict__.pop("port")
+    serve(MockParams(**vars(args)), port)
@@ -0,0 +1,120 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ["evaluate", "generate", "judge"]
+MODULES = [*SCRIPTS, "lone_arena.config", "lone_arena.chatcup", "lone_arena.judge"]
+
+
+def import_time(module: str) -> tuple[float, list[tuple[str, float]]]:
+    # cumulative import time of `module` and of its heaviest top-level imports,
+    # in ms, from a fresh interpreter
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    children: dict[str, float] = {}
+    for line in p.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2][1:]
+        ms = int(parts[1]) / 1000
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            if name == module:
+                heaviest = sorted(children.items(), key=lambda t: -t[1])[:3]
+                return ms, [(m, round(t, 1)) for m, t in heaviest]
+            children = {}
+        elif depth == 1:
+            children[name.strip()] = ms
+    raise ValueError(f"no import time for {module}")
+
+
+def help_time(script: str, repeat: int) -> float:
+    # median wall time of `python <script>.py --help`, in ms
+    walls = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(
+            [sys.executable, f"{script}.py", "--help"],
+            cwd=ROOT,
+            capture_output=True,
+            check=True,
+        )
+        walls.append(time.perf_counter() - t0)
+    return statistics.median(walls) * 1000
+
+
+def revision() -> str:
+    p = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    return p.stdout.strip() or "unknown"
+
+
+def main():
+    argp = argparse.ArgumentParser(
+        description="Measure the startup time of the entry points"
+    )
+    argp.add_argument("--repeat", type=int, default=5)
+    argp.add_argument(
+        "--history",
+        type=str,
+        default=str(ROOT / "bench" / "startup-history.jsonl"),
+        help="append the results here and compare with the last entry",
+    )
+    argp.add_argument("--no-save", action="store_true")
+    args = argp.parse_args()
+
+    history = Path(args.history)
+    last = None
+    if history.exists():
+        if lines := history.read_text().splitlines():
+            last = json.loads(lines[-1])
+
+    def delta(kind: str, name: str, ms: float) -> str:
+        if last is None or name not in last[kind]:
+            return ""
+        return f" ({ms - last[kind][name]:+.0f} vs {last['revision']})"
+
+    entry = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": revision(),
+        "python": sys.version.split()[0],
+        "import_ms": {},
+        "help_ms": {},
+    }
+    for module in MODULES:
+        total, heaviest = import_time(module)
+        entry["import_ms"][module] = round(total, 1)
+        deps = ", ".join(f"{m} {t:.0f}" for m, t in heaviest)
+        print(
+            f"import {module:<20} {total:>7.0f} ms{delta('import_ms', module, total)}"
+            f" | {deps}"
+        )
+    for script in SCRIPTS:
+        wall = help_time(script, args.repeat)
+        entry["help_ms"][script] = round(wall, 1)
+        print(
+            f"{script + '.py --help':<27} {wall:>7.0f} ms{delta('help_ms', script, wall)}"
+        )
+
+    if not args.no_save:
+        with history.open("a") as fo:
+            print(json.dumps(entry), file=fo)
+
+
+if __name__ == "__main__":
+    main()
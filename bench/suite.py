@@ -0,0 +1,219 @@
+from lone_arena import compact
+from lone_arena.chatcup import MLE_Elo
+from lone_arena.files import DocumentDir, MatchJournal
+from lone_arena.tournament import (
+    single_elimination,
+    pair_matches,
+    run_tournament,
+    Player,
+    Podium,
+)
+
+from attrs import define, asdict
+
+import argparse
+import json
+import math
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@define
+class Synthetic:
+    prompts: int = 32
+    models: int = 8
+    samples: int = 16
+    response_len: int = 2000  # characters per response
+    seed: int = 0
+
+    @property
+    def prompt_names(self) -> list[str]:
+        return [f"p{i:03d}" for i in range(self.prompts)]
+
+    @property
+    def model_names(self) -> list[str]:
+        return [f"m{i:03d}" for i in range(self.models)]
+
+    def players(self, pname: str, mname: str) -> list[Player]:
+        return [(pname, mname, i) for i in range(self.samples)]
+
+    def compete(self) -> Callable[[Player, Player], tuple[Player, Player]]:
+        # later models are stronger, by 100 Elo points each
+        rng = random.Random(self.seed)
+        rank = {m: i for i, m in enumerate(self.model_names)}
+
+        def compete(a, b):
+            p = 1 / (1 + 10 ** ((rank[b[1]] - rank[a[1]]) / 4))
+            return (a, b) if rng.random() < p else (b, a)
+
+        return compete
+
+    def write_docs(self, data_dir: Path) -> DocumentDir:
+        rng = random.Random(self.seed)
+        words = ["".join(rng.choices(string.ascii_lowercase, k=6)) for _ in range(512)]
+        docsd = DocumentDir(data_dir)
+        for pname in self.prompt_names:
+            for mname in self.model_names:
+                msgs = []
+                for _ in range(self.samples):
+                    text = " ".join(rng.choices(words, k=self.response_len // 7 + 1))
+                    msgs.append(
+                        [
+                            {"role": "user", "content": f"prompt {pname}"},
+                            {"role": "assistant", "content": text[: self.response_len]},
+                        ]
+                    )
+                docsd.dump(msgs, pname, mname)
+        return docsd
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> dict:
+    # best wall time of `repeat` runs after a warm-up, then peak traced memory
+    fn()
+    walls = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        walls.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "time_ms": round(min(walls) * 1000, 2),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def stages(syn: Synthetic, data_dir: Path) -> dict[str, Callable[[], Any]]:
+    pnames, mnames = syn.prompt_names, syn.model_names
+    cup = MLE_Elo(pnames, mnames, syn.samples)
+    podiums: list[Podium] = list(cup.run(syn.compete()))
+    weights = [1.0] * len(pnames)
+    docsd = syn.write_docs(data_dir / "docs")
+    njournal = 0
+
+    def build_single_elimination():
+        for pname in pnames:
+            for mname in mnames:
+                single_elimination(syn.players(pname, mname))
+
+    def build_pair_matches():
+        for pname in pnames:
+            pair_matches(
+                [syn.players(pname, m)[: syn.samples // 2] for m in mnames],
+                return_loser=True,
+            )
+
+    def run_cup():
+        list(cup.run(syn.compete()))
+
+    def run_cup_compact():
+        list(cup.run(syn.compete(), engine=compact))
+
+    def run_cup_journal():
+        nonlocal njournal
+        njournal += 1
+        journal = MatchJournal(data_dir / f"journal{njournal}")
+        list(cup.run(syn.compete(), journal=journal))
+
+    def run_single_elimination():
+        compete = syn.compete()
+        for pname in pnames:
+            run_tournament(
+                *(single_elimination(syn.players(pname, m)) for m in mnames),
+                compete=compete,
+            )
+
+    def load_docs():
+        docs = DocumentDir(docsd.data_dir).load(pnames, mnames)
+        for key in docs:
+            docs[key]
+
+    s = {
+        "pair_matches": build_pair_matches,
+        "run_tournament mle_elo": run_cup,
+        "run_tournament mle_elo+journal": run_cup_journal,
+        "run_tournament mle_elo compact": run_cup_compact,
+        "tabulate_result": lambda: cup.tabulate_result(podiums, weights),
+        "tabulate_result+bootstrap": lambda: MLE_Elo(
+            pnames, mnames, syn.samples, bootstrap=100
+        ).tabulate_result(podiums, weights),
+        "DocumentDir.load": load_docs,
+    }
+    if math.log2(syn.samples).is_integer():
+        s["single_elimination"] = build_single_elimination
+        s["run_tournament single_elimination"] = run_single_elimination
+    return s
+
+
+def main():
+    argp = argparse.ArgumentParser(
+        description="Benchmark brackets, tabulation and document I/O on synthetic data"
+    )
+    argp.add_argument("--prompts", type=int, default=32)
+    argp.add_argument("--models", type=int, default=8)
+    argp.add_argument(
+        "--samples", type=int, default=16, help="divisible by 4, 2^n for all stages"
+    )
+    argp.add_argument("--response-len", type=int, default=2000)
+    argp.add_argument("--repeat", type=int, default=7)
+    argp.add_argument(
+        "--baseline",
+        type=str,
+        default=str(ROOT / "bench" / "baseline.json"),
+        help="compare with the results saved here",
+    )
+    argp.add_argument(
+        "--save", action="store_true", help="save the results as the baseline"
+    )
+    argp.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="slowdown or memory growth over the baseline reported as a regression",
+    )
+    args = argp.parse_args()
+
+    syn = Synthetic(args.prompts, args.models, args.samples, args.response_len)
+    baseline = None
+    if (path := Path(args.baseline)).exists():
+        baseline = json.loads(path.read_text())
+        if baseline["params"] != asdict(syn):
+            print(f"baseline {path} is for {baseline['params']}, not compared")
+            baseline = None
+
+    results, regressions = {}, []
+    with tempfile.TemporaryDirectory() as data_dir:
+        for name, fn in stages(syn, Path(data_dir)).items():
+            r = results[name] = measure(fn, args.repeat)
+            line = f"{name:<36} {r['time_ms']:>10.2f} ms {r['peak_kib']:>10.1f} KiB"
+            if baseline is not None and (b := baseline["results"].get(name)):
+                ratios = [r[k] / max(b[k], 1e-9) for k in ("time_ms", "peak_kib")]
+                line += f"  ({ratios[0]:.2f}x time, {ratios[1]:.2f}x memory)"
+                # sub-millisecond differences are timer noise
+                slower = ratios[0] > args.tolerance and r["time_ms"] - b["time_ms"] > 1
+                if slower or ratios[1] > args.tolerance:
+                    line += "  REGRESSION"
+                    regressions.append(name)
+            print(line)
+
+    if args.save:
+        path.write_text(
+            json.dumps({"params": asdict(syn), "results": results}, indent=2) + "\n"
+        )
+        print(f"baseline saved to {path}")
+    if regressions:
+        sys.exit(f"regressions over {args.tolerance}x: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
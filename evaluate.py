@@ -1,80 +1,179 @@
-from lone_arena.chatcup import cup_factory
+from lone_arena.chatcup import cup_factory, ActiveElo, MLE_Elo
 from lone_arena.config import load_config, Config
-from lone_arena.files import DocumentDir, ResultDir
+from lone_arena.files import CacheDir, MatchJournal
+from lone_arena.judge import LLMJudge, VerdictCache
+from lone_arena.store import open_stores
 from lone_arena.format import format_conversation
+from lone_arena.scheduler import MatchScheduler, Ticket
 
-import gradio as gr
+from attrs import define, field
 
-from queue import Queue
+import asyncio
 import argparse
+import threading
 from functools import partial
+from typing import Any, TYPE_CHECKING
 
-req_queue = Queue()
-rsp_queue = Queue()
-prog_notify = Queue()
+# gradio, pandas and the like are imported where needed, so that --help and
+# config errors come back right away
+if TYPE_CHECKING:
+    import pandas as pd
+    from lone_arena.rating import OnlineElo
 
 
-def main(conf: Config):
-    def compete(a, b):
-        ca, cb = (
-            format_conversation(docs.get(a, [])),
-            format_conversation(docs.get(b, [])),
-        )
-        req_queue.put((ca, cb))
-        result = rsp_queue.get()
-        if result == 0:
-            return a, b
-        return b, a
-
-    mnames = [x.name for x in conf.model]
-    pnames = [x.name for x in conf.prompt]
-    docsd = DocumentDir(conf.data_dir)
-    docs = docsd.load(pnames, mnames)
-
-    resultd = ResultDir(conf.data_dir)
-    podiums, pnames_todo = resultd.load(pnames)
-    if podiums:
-        if pnames_todo:
-            print("Partially completed, resuming...")
+@define(slots=False)
+class Arena:
+    # one tournament shared by every rater's session; it runs in a background
+    # thread and waits on the scheduler for each decision
+    conf: Config
+    judge_prelim: bool = False  # leave same-model matches to the LLM judge
+    scheduler: MatchScheduler = field(init=False)
+    result: Any = None
+    error: BaseException | None = None  # why the evaluation stopped, if it failed
+    leaderboard: "OnlineElo | None" = None
+    done: threading.Event = field(init=False, factory=threading.Event)
+
+    def __attrs_post_init__(self):
+        mnames = [x.name for x in self.conf.model]
+        pnames = [x.name for x in self.conf.prompt]
+        self.docsd, self.resultd = open_stores(self.conf)
+        self.docs = self.docsd.load(pnames, mnames)
+        self.scheduler = MatchScheduler(self.render)
+        self.score_weights = {p.name: p.score_weight for p in self.conf.prompt}
+
+    def render(self, player) -> str:
+        return format_conversation(self.docs.get(player, []))
+
+    def render_html(self, player) -> str:
+        # for the lean page
+        from lone_arena.lean import to_html
+
+        return to_html(self.docs.get(player, []))
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self.main(),), daemon=True).start()
+
+    async def main(self):
+        # raters and `wait_result` learn of a failure instead of waiting forever
+        try:
+            await self.evaluate()
+        except BaseException as e:
+            self.error = e
+            self.scheduler.finish(f"Evaluation failed: {e!r}")
+            raise
+        finally:
+            self.done.set()
+
+    async def evaluate(self):
+        conf, resultd = self.conf, self.resultd
+        mnames = [x.name for x in conf.model]
+        pnames = [x.name for x in conf.prompt]
+
+        podiums, pnames_todo = resultd.load(pnames, mnames)
+        msg = f"End of evaluation. Winning responses can be found in {resultd.location}"
+        if podiums:
+            if pnames_todo:
+                print("Partially completed, resuming...")
+            else:
+                msg = f"Loaded completed result. To re-evaluate, remove results from {resultd.location}"
+                print(msg)
+
+        journal = MatchJournal(conf.data_dir)
+        cup = cup_factory(pnames_todo, mnames, conf)
+        # earlier human verdicts on the same pair of responses are reused; after
+        # adding a model, that is mostly the first round (see README)
+        verdicts = VerdictCache(CacheDir(conf.data_dir, "verdict"), self.docs)
+        compete = verdicts.wrap(self.scheduler.compete, on_hit=self.scheduler.skip)
+        if isinstance(cup, MLE_Elo):
+            from lone_arena.rating import OnlineElo
+
+            self.leaderboard = OnlineElo(mnames)
+            outcomes = journal.outcomes(pnames_todo)
+            for pair in [o for p in podiums for o in cup.pairwise_outcomes(p)]:
+                self.record(*pair)
+            for pair in outcomes:
+                self.record(*pair)
+            if isinstance(cup, ActiveElo):
+                cup.resume(podiums, outcomes)  # pick the next matches knowing these
+            self.dump_leaderboard()
+            compete = partial(self.rated, compete)
+        if self.judge_prelim:
+            assert conf.judge is not None, "config: expect a [judge] model"
+            judge = LLMJudge(conf.judge, self.docs)
+            judge_verdicts = VerdictCache(
+                CacheDir(conf.data_dir, "judge"), self.docs, judge.context
+            )
+            compete = partial(self.prelim, judge_verdicts.wrap(judge), compete)
+        todo_match = cup.nmatch()
+        if isinstance(cup, ActiveElo):
+            self.played = sum(len(cup.pairwise_outcomes(p)) for p in podiums)
         else:
-            msg = f"Loaded completed result. To re-evaluate, remove results from {resultd.result_dir}"
-            print(msg)
-            req_queue.put((msg, ""))
+            self.played = cup.nmatch(len(pnames)) - todo_match
+        self.cup = cup
+        self.scheduler.total = self.played + todo_match
+        self.scheduler.completed = self.played + journal.count(pnames_todo)
+        try:
+            itournament = cup.arun(compete, journal=journal)
+            for pname in pnames_todo:
+                podium = await anext(itournament)
+                podiums.append(podium)
+                resultd.dump(podium, self.docs, pname, mnames)
+                journal.discard(pname)
+                self.replan()
+        finally:
+            if verdicts.hits:
+                print(f"Reused {verdicts.hits} earlier verdicts")
+        if verdicts.hits:
+            msg += f" ({verdicts.hits} matches decided by earlier verdicts)"
+        self.scheduler.finish(msg)
 
-    cup = cup_factory(pnames_todo, mnames, conf)
-    todo_match, total_match = cup.nmatch(), cup.nmatch(len(pnames))
-    prog_notify.put((total_match - todo_match, total_match))
-    itournament = cup.run(compete)
-    for pname, podium in zip(pnames_todo, itournament):
-        podiums.append(podium)
-        resultd.dump(podium, docs, pname)
-    msg = f"End of evaluation. Winning responses can be found in {resultd.result_dir}"
-    req_queue.put((msg, ""))
+        score_weights = [p.score_weight for p in conf.prompt]
+        self.result = cup.tabulate_result(podiums, score_weights)
 
-    score_weights = [p.score_weight for p in conf.prompt]
-    result = cup.tabulate_result(podiums, score_weights)
-    return gr.DataFrame(visible=True, value=result)
+    async def rated(self, compete, a, b):
+        winner, loser = await compete(a, b)
+        self.record(winner, loser)
+        self.dump_leaderboard()
+        self.replan()
+        return winner, loser
 
+    def replan(self):
+        # active_elo stops a prompt early once the ratings are confident
+        if isinstance(self.cup, ActiveElo):
+            self.scheduler.total = self.played + self.cup.nmatch()
 
-def init():
-    da, db = req_queue.get()
-    cm, tm = prog_notify.get()
-    return da, db, cm, tm, gr.Slider(value=round(cm / tm, 2))
+    async def prelim(self, judge, compete, a, b):
+        if a[1] != b[1]:
+            return await compete(a, b)
+        outcome = await judge(a, b)
+        self.scheduler.skip()
+        return outcome
 
+    def record(self, winner, loser):
+        assert self.leaderboard is not None
+        weight = self.score_weights[winner[0]]
+        self.leaderboard.record(winner[1], loser[1], weight)
 
-def on_decision(completed_match: int, total_match: int, ev_data: gr.EventData):
-    if completed_match == total_match:
-        return gr.Markdown(), gr.Markdown()  # no more updates
-    rsp_queue.put(int(ev_data.target.elem_id[-1]) - 1)  # type: ignore
-    doc_a, doc_b = req_queue.get()
-    return doc_a, doc_b
+    def standings(self) -> "pd.DataFrame":
+        import pandas as pd
+        import numpy as np
 
+        assert self.leaderboard is not None
+        lb = self.leaderboard
+        tb = pd.DataFrame(
+            {
+                "Model": lb.model_names,
+                "Elo rating": np.round(list(lb.ratings().values())),
+                "Won": lb.wins.sum(1).round(1),
+                "Lost": lb.wins.sum(0).round(1),
+            }
+        )
+        return tb.sort_values("Elo rating", ascending=False, ignore_index=True)
 
-def progbar_update(completed_match: int, total_match: int):
-    if completed_match < total_match:
-        completed_match += 1
-    progress = round(completed_match / total_match, 2)
-    return completed_match, gr.Slider(value=progress)
+    def dump_leaderboard(self):
+        path = self.conf.data_dir / "result" / "leaderboard.csv"
+        path.parent.mkdir(exist_ok=True, parents=True)
+        self.standings().to_csv(path, index=False)
 
 
 shortcut_js = """
@@ -95,13 +194,52 @@ document.addEventListener('keypress', shortcuts, false);
 """
 
 
-def ui(conf: Config):
+def ui(arena: Arena):
+    import gradio as gr
+
+    scheduler = arena.scheduler
+
+    def show(ticket: Ticket | None):
+        progress = gr.Slider(
+            value=round(scheduler.completed / max(1, scheduler.total), 2)
+        )
+        standings = (
+            gr.DataFrame(value=arena.standings())
+            if arena.leaderboard is not None
+            else gr.DataFrame()
+        )
+        if ticket is None:
+            return scheduler.message, "", progress, standings
+        return *scheduler.docs(ticket), progress, standings
+
+    # `scheduler.next` blocks until some other rater's decision makes a match
+    # ready, so these handlers must not queue behind one another:
+    # they run with concurrency_limit=None
+    def init(request: gr.Request):
+        return show(scheduler.next(request.session_hash))
+
+    def on_decision(choice: int):
+        def decide(request: gr.Request):
+            scheduler.decide(request.session_hash, choice)
+            return show(scheduler.next(request.session_hash))
+
+        return decide
+
+    def on_unload(request: gr.Request):
+        scheduler.release(request.session_hash)
+
+    def wait_result():
+        arena.done.wait()
+        if arena.error is not None:
+            raise gr.Error(f"Evaluation failed: {arena.error!r}")
+        return gr.DataFrame(visible=True, value=arena.result)
+
+    conf = arena.conf
     with gr.Blocks(
         title="Lone Arena",
         head=shortcut_js,
         theme=gr.themes.Default(spacing_size=gr.themes.sizes.spacing_lg),
     ) as demo:
-        completed_match, total_match = gr.State(0), gr.State(1)
         progbar = gr.Slider(0, 1, 0, label="Progress", container=False)
         gr.Markdown(
             """
@@ -115,39 +253,58 @@ def ui(conf: Config):
             with gr.Column(variant="panel"):
                 choose2 = gr.Button("👇This one's better [j]", elem_id="choose2")
                 candidate2 = gr.Markdown(line_breaks=True)
+        with gr.Accordion("Leaderboard", open=False):
+            leaderboard = gr.DataFrame()
         result_table = gr.DataFrame(visible=True, row_count=len(conf.prompt) + 1)
 
-        gr.on(
-            triggers=[choose1.click, choose2.click],
-            fn=on_decision,
-            inputs=[completed_match, total_match],
-            outputs=[candidate1, candidate2],
-            show_progress="minimal",
-        ).then(
-            progbar_update,
-            inputs=[completed_match, total_match],
-            outputs=[completed_match, progbar],
-            show_progress="hidden",
-        )
-        demo.load(
-            init,
-            outputs=[candidate1, candidate2, completed_match, total_match, progbar],
-        )
+        outputs = [candidate1, candidate2, progbar, leaderboard]
+        for i, button in enumerate([choose1, choose2]):
+            button.click(
+                on_decision(i),
+                outputs=outputs,
+                show_progress="minimal",
+                concurrency_limit=None,
+                api_name=f"choose{i + 1}",
+            )
+        demo.load(init, outputs=outputs, concurrency_limit=None, api_name="init")
+        demo.unload(on_unload)
         # workaround for https://github.com/gradio-app/gradio/issues/7101
         demo.load(
             lambda: gr.DataFrame(visible=False),
             outputs=[result_table],
         )
-        demo.load(partial(main, conf), outputs=[result_table])
+        demo.load(wait_result, outputs=[result_table], concurrency_limit=None)
     return demo
 
 
 if __name__ == "__main__":
     argp = argparse.ArgumentParser(description="Host the evaluation Web UI")
     argp.add_argument("--port", type=int, default=7860)
+    argp.add_argument(
+        "--lean",
+        action="store_true",
+        help="also serve a minimal judging page at / (Web UI moves to /ui)",
+    )
+    argp.add_argument(
+        "--judge-prelim",
+        action="store_true",
+        help="let the [judge] model decide matches between responses of the same model",
+    )
     argp.add_argument("config", type=str)
     args = argp.parse_args()
     conf = load_config(args.config)
 
-    demo = ui(conf)
-    demo.launch(server_port=args.port, show_api=False, quiet=True)
+    arena = Arena(conf, judge_prelim=args.judge_prelim)
+    arena.start()
+    demo = ui(arena)
+    if args.lean:
+        from lone_arena.lean import lean_app
+        import gradio as gr
+        import uvicorn
+
+        app = gr.mount_gradio_app(
+            lean_app(arena.scheduler, arena.render_html), demo, path="/ui"
+        )
+        uvicorn.run(app, port=args.port)
+    else:
+        demo.launch(server_port=args.port, show_api=False, quiet=True)
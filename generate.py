@@ -1,13 +1,22 @@
-from lone_arena.config import load_config, Model, Config
-from lone_arena.files import DocumentDir
+from lone_arena.config import load_config, split_params, Model, Config
+from lone_arena.files import CacheDir
+from lone_arena.retry import MAX_ATTEMPTS, backoff_delay, overload_errors, retry_after
+from lone_arena.store import open_stores
 
-import openai
 from tqdm import tqdm
+from attrs import define, asdict
 
 import asyncio
 import argparse
 import re
-from typing import Any
+import time
+import json
+from contextlib import nullcontext
+from typing import Any, TextIO, TYPE_CHECKING
+
+# openai takes a while to import, so it waits until requests are made
+if TYPE_CHECKING:
+    import openai
 
 ROLE_TAG = re.compile(r"^(user|assistant|system): ?(.*)$")
 
@@ -23,78 +32,371 @@ def parse_chat(chat: str) -> list[dict]:
     return msg
 
 
-def split_params(params: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
-    params = params.copy()
-    client_params = {}
-    for k in ["api_key", "organization", "base_url", "timeout", "max_retries"]:
-        if k in params:
-            client_params[k] = params.pop(k)
-    return client_params, params
+@define
+class AdaptiveConcurrency:
+    # AIMD: slow start up to `ceiling`, then additive increase while latency
+    # stays healthy; halve on overload, at most once per round trip
+    ceiling: int
+    window: float = 1.0
+    slow_start: bool = True
+    latency: float | None = None  # EWMA of request latency
+    base_latency: float | None = None
+    last_decrease: float = 0.0
+    overloads: int = 0
+
+    @property
+    def limit(self) -> int:
+        return max(1, min(self.ceiling, int(self.window)))
+
+    def on_success(self, latency: float):
+        self.latency = (
+            latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        )
+        self.base_latency = min(self.base_latency or self.latency, self.latency)
+        if self.latency > 2 * self.base_latency:
+            return  # requests are queueing up at the server, hold
+        step = 1 if self.slow_start else 1 / self.window
+        self.window = min(self.ceiling, self.window + step)
+
+    def on_overload(self) -> bool:
+        self.overloads += 1
+        now = time.monotonic()
+        if now - self.last_decrease < (self.latency or 1.0):
+            return False
+        self.window = max(1.0, self.window / 2)
+        self.slow_start = False
+        self.last_decrease = now
+        return True
+
+
+@define
+class RequestMetrics:
+    model: str
+    prompt: str
+    n: int
+    sent_at: float  # unix time
+    queue_wait: float  # waiting for the global concurrency limit
+    latency: float
+    ttft: float | None  # only with streaming
+    prompt_tokens: int | None
+    completion_tokens: int | None
+    retries: int
+
+
+def percentile(xs: list[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+def summarize(records: list[RequestMetrics]) -> str:
+    if not records:
+        return "no requests"
+    latency = [r.latency for r in records]
+    ttft = [r.ttft for r in records if r.ttft is not None]
+    ntoken = sum(r.completion_tokens or 0 for r in records)
+    wall = max(r.sent_at + r.latency for r in records) - min(
+        r.sent_at - r.queue_wait for r in records
+    )
+    s = (
+        f"{len(records)} requests, "
+        f"latency p50 {percentile(latency, 0.5):.2f}s p95 {percentile(latency, 0.95):.2f}s, "
+    )
+    if ttft:
+        s += (
+            f"TTFT p50 {percentile(ttft, 0.5):.2f}s p95 {percentile(ttft, 0.95):.2f}s, "
+        )
+    s += (
+        f"queue wait avg {sum(r.queue_wait for r in records) / len(records):.2f}s, "
+        f"retries {sum(r.retries for r in records)}, "
+        f"{ntoken / wall:.1f} tokens/s"
+    )
+    return s
+
+
+async def chat_completion(
+    client: "openai.AsyncOpenAI", stream: bool, **params
+) -> tuple[list[str | None], Any, float | None]:
+    # returns content of each choice, usage, and time to first token
+    if not stream:
+        c = await client.chat.completions.create(**params)
+        return [x.message.content for x in c.choices], c.usage, None
+    t0 = time.monotonic()
+    ttft, usage = None, None
+    parts: dict[int, list[str]] = {}
+    chunks = await client.chat.completions.create(
+        stream=True, stream_options={"include_usage": True}, **params
+    )
+    async for chunk in chunks:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        for x in chunk.choices:
+            if x.delta.content:
+                ttft = ttft or time.monotonic() - t0
+                parts.setdefault(x.index, []).append(x.delta.content)
+    n = params.get("n", 1)
+    return ["".join(parts[i]) if i in parts else None for i in range(n)], usage, ttft
 
 
 async def batch_request(
-    model: Model, prompts: dict[str, list], conf: Config, batch_size: int = 1
-):
+    model: Model,
+    prompts: dict[str, list],
+    conf: Config,
+    batch_size: int = 1,
+    limit: asyncio.Semaphore | None = None,
+    position: int | None = None,
+    resume: bool = False,
+    empty_retries: int = 3,
+    n_choices: int = 1,
+    cache: CacheDir | None = None,
+    stream: bool = False,
+    metrics_file: TextIO | None = None,
+) -> list[RequestMetrics]:
+    # `limit` is shared by all models to cap the total number of requests in flight
+    import openai
+
+    overload = overload_errors()
+    ctl = AdaptiveConcurrency(ceiling=model.concurrency or batch_size)
     client_params, completion_params = split_params(model.openai_params)
+    client_params.setdefault("max_retries", 0)  # retries are paced by `ctl`
     client = openai.AsyncOpenAI(**client_params)
-    docsd = DocumentDir(conf.data_dir)
-    pbar = tqdm(total=conf.sample * len(prompts), desc=f"model {model.name}")
-
-    results = {}
-
-    async def make_request(pname: str, messages: list):
-        nonlocal client, completion_params, results
-        content = ""
-        while not content:
-            chat_completion = await client.chat.completions.create(
-                messages=messages,
-                **completion_params,
+    docsd, _ = open_stores(conf)
+    cache_params = {"base_url": client_params.get("base_url"), **completion_params}
+    ncached = 0
+    records = []
+
+    existing = {}
+    for pname in prompts:
+        if resume:
+            docsd.repair(pname, model.name)
+            existing[pname] = docsd.count(pname, model.name)
+        else:
+            existing[pname] = 0
+    # without --resume, a prompt's earlier responses are replaced once its first
+    # new one arrives, so a failed run keeps the responses it didn't get to
+    rewritten = set(prompts) if resume else set()
+    pbar = tqdm(
+        total=conf.sample * len(prompts),
+        initial=sum(min(n, conf.sample) for n in existing.values()),
+        desc=f"model {model.name}",
+        position=position,
+    )
+
+    def show_status():
+        pbar.set_postfix(concurrency=ctl.limit, overloads=ctl.overloads, cached=ncached)
+
+    def save(pname: str, messages: list, content: str, key: str | None):
+        msg = [*messages, {"role": "assistant", "content": content}]
+        if pname not in rewritten:
+            rewritten.add(pname)
+            docsd.dump([msg], pname, model.name)
+        else:
+            docsd.append(msg, pname, model.name)
+        if cache is not None and key is not None:
+            cache.put(key, content)
+
+    async def make_request(pname: str, messages: list, idxs: list[int]) -> int:
+        # request samples `idxs` in one call with `n`, return the number gathered
+        nonlocal client, completion_params, n_choices, ncached
+        keys = {i: CacheDir.key(cache_params, messages, i) for i in idxs}
+        if cache is not None:
+            for i in list(idxs):
+                if (content := cache.get(keys[i])) is not None:
+                    save(pname, messages, content, None)
+                    idxs.remove(i)
+                    ncached += 1
+        gathered = len(keys) - len(idxs)
+        if len(idxs) > n_choices:
+            todo.extend((pname, messages, [i]) for i in idxs[1:])
+            idxs = idxs[:1]
+        attempt, empty, queue_wait = 0, 0, 0.0
+        while idxs:
+            n = len(idxs)
+            try:
+                t_queued = time.monotonic()
+                async with limit or nullcontext():
+                    t0 = time.monotonic()
+                    queue_wait += t0 - t_queued
+                    sent_at = time.time()
+                    contents, usage, ttft = await chat_completion(
+                        client,
+                        stream,
+                        messages=messages,
+                        **completion_params,
+                        **({"n": n} if n > 1 else {}),
+                    )
+            except overload as e:
+                attempt += 1
+                if attempt >= MAX_ATTEMPTS:
+                    raise
+                delay = backoff_delay(attempt, retry_after(e))
+                if ctl.on_overload():
+                    tqdm.write(
+                        f"model {model.name}: {type(e).__name__}, "
+                        f"concurrency -> {ctl.limit}, retry in {delay:.1f}s"
+                    )
+                show_status()
+                await asyncio.sleep(delay)
+                continue
+            except (openai.BadRequestError, openai.UnprocessableEntityError):
+                if n == 1:
+                    raise
+                if n_choices > 1:
+                    n_choices = 1
+                    tqdm.write(f"model {model.name}: `n` refused, falling back to n=1")
+                todo.extend((pname, messages, [i]) for i in idxs)
+                return gathered
+            latency = time.monotonic() - t0
+            ctl.on_success(latency)
+            record = RequestMetrics(
+                model=model.name,
+                prompt=pname,
+                n=n,
+                sent_at=sent_at,
+                queue_wait=queue_wait,
+                latency=latency,
+                ttft=ttft,
+                prompt_tokens=getattr(usage, "prompt_tokens", None),
+                completion_tokens=getattr(usage, "completion_tokens", None),
+                retries=attempt + empty,
             )
-            content = chat_completion.choices[0].message.content
-        results.setdefault(pname, [])
-        results[pname].append([*messages, {"role": "assistant", "content": content}])
+            records.append(record)
+            if metrics_file is not None:
+                print(json.dumps(asdict(record)), file=metrics_file, flush=True)
+            queue_wait = 0.0
+            contents = contents[:n]
+            for content in filter(None, contents):
+                save(pname, messages, content, keys[idxs.pop(0)])
+                gathered += 1
+            if not idxs:
+                continue
+            empty += 1
+            if empty > empty_retries:
+                tqdm.write(
+                    f"model {model.name}: skipped {len(idxs)} sample(s) of {pname} "
+                    f"after {empty} empty responses"
+                )
+                break
+            await asyncio.sleep(backoff_delay(empty))
+        return gathered
 
-    todo = list(prompts.items()) * conf.sample
+    todo = []
+    for i in range(0, conf.sample, n_choices):
+        for pname, messages in prompts.items():
+            if idxs := list(range(existing[pname] + i, conf.sample))[:n_choices]:
+                todo.append((pname, messages, idxs))
     tasks = set()
 
     def queue_request():
         nonlocal todo, tasks
-        pname, message = todo.pop()
-        tasks.add(asyncio.create_task(make_request(pname, message)))
+        tasks.add(asyncio.create_task(make_request(*todo.pop())))
 
-    for i in range(batch_size):
+    for i in range(ctl.limit):
         if todo:
             queue_request()
+    show_status()
 
     while tasks:
         done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
 
         for task in done:
-            pbar.update(1)
             tasks.remove(task)
-            await task
+            pbar.update(await task)
 
-        while todo and len(tasks) < batch_size:
+        while todo and len(tasks) < ctl.limit:
             queue_request()
-
-    for pname, msg_list in results.items():
-        docsd.dump(msg_list, pname, model.name)
+        show_status()
 
     pbar.close()
+    return records
 
 
 async def main():
     argp = argparse.ArgumentParser(
         description="Gather sample responses from model endpoints"
     )
-    argp.add_argument("--batch-size", type=int, default=4)
+    argp.add_argument(
+        "--batch-size",
+        type=int,
+        default=4,
+        help="max concurrent requests per model, unless `concurrency` is set for the model; "
+        "concurrency ramps up to it and backs off on 429/5xx",
+    )
+    argp.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="max concurrent requests across all models (default: unlimited)",
+    )
+    argp.add_argument(
+        "--resume",
+        action="store_true",
+        help="keep existing responses and only request the missing samples",
+    )
+    argp.add_argument(
+        "--empty-retries",
+        type=int,
+        default=3,
+        help="retries for an empty response before skipping the sample",
+    )
+    argp.add_argument(
+        "--n-choices",
+        type=int,
+        default=1,
+        help="request up to this many samples per call with `n` "
+        "(falls back to 1 if the endpoint refuses)",
+    )
+    argp.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always request from endpoints instead of reusing cached responses",
+    )
+    argp.add_argument(
+        "--cache-size",
+        type=float,
+        default=1024,
+        help="max size of the response cache in MiB",
+    )
+    argp.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream responses to measure time to first token",
+    )
     argp.add_argument("config", type=str)
     args = argp.parse_args()
 
     conf = load_config(args.config)
     prompts = {p.name: parse_chat(p.chat) for p in conf.prompt}
-    for model in conf.model:
-        await batch_request(model, prompts, conf, batch_size=args.batch_size)
+    cache = None if args.no_cache else CacheDir(conf.data_dir, "response")
+    limit = asyncio.Semaphore(args.max_concurrency) if args.max_concurrency else None
+    metrics_dir = conf.data_dir / "metrics"
+    metrics_dir.mkdir(exist_ok=True, parents=True)
+    metrics_path = metrics_dir / f"generate-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+    with metrics_path.open("w") as metrics_file:
+        records = await asyncio.gather(
+            *(
+                batch_request(
+                    model,
+                    prompts,
+                    conf,
+                    batch_size=args.batch_size,
+                    limit=limit,
+                    position=i,
+                    resume=args.resume,
+                    empty_retries=args.empty_retries,
+                    n_choices=args.n_choices,
+                    cache=cache,
+                    stream=args.stream,
+                    metrics_file=metrics_file,
+                )
+                for i, model in enumerate(conf.model)
+            )
+        )
+    if cache is not None:
+        cache.evict(int(args.cache_size * 2**20))
+
+    print(f"\nRequest metrics saved to {metrics_path}")
+    for model, model_records in zip(conf.model, records):
+        print(f"model {model.name}: {summarize(model_records)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+from lone_arena.chatcup import cup_factory, ActiveElo
+from lone_arena.config import load_config
+from lone_arena.files import CacheDir, MatchJournal
+from lone_arena.judge import LLMJudge, VerdictCache
+from lone_arena.store import open_stores
+
+from tqdm import tqdm
+
+import asyncio
+import argparse
+
+
+async def main():
+    argp = argparse.ArgumentParser(
+        description="Run the evaluation with an LLM judge instead of human raters"
+    )
+    argp.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always ask the judge instead of reusing cached verdicts",
+    )
+    argp.add_argument("config", type=str)
+    args = argp.parse_args()
+
+    conf = load_config(args.config)
+    assert conf.judge is not None, "config: expect a [judge] model"
+    mnames = [x.name for x in conf.model]
+    pnames = [x.name for x in conf.prompt]
+    docsd, resultd = open_stores(conf)
+    docs = docsd.load(pnames, mnames)
+    judge = LLMJudge(conf.judge, docs)
+    verdicts = VerdictCache(CacheDir(conf.data_dir, "judge"), docs, judge.context)
+    ask = judge if args.no_cache else verdicts.wrap(judge)
+
+    podiums, pnames_todo = resultd.load(pnames, mnames)
+    journal = MatchJournal(conf.data_dir)
+    cup = cup_factory(pnames_todo, mnames, conf)
+    if isinstance(cup, ActiveElo):
+        cup.resume(podiums, journal.outcomes(pnames_todo))
+    pbar = tqdm(total=cup.nmatch(), initial=journal.count(pnames_todo))
+
+    def summary() -> str:
+        return f"{judge.summary()}, {verdicts.hits} cached verdicts"
+
+    async def compete(a, b):
+        outcome = await ask(a, b)
+        pbar.total = cup.nmatch()  # active_elo may stop early
+        pbar.update()
+        pbar.set_postfix_str(summary())
+        return outcome
+
+    itournament = cup.arun(compete, journal=journal)
+    for pname in pnames_todo:
+        podium = await anext(itournament)
+        podiums.append(podium)
+        resultd.dump(podium, docs, pname, mnames)
+        journal.discard(pname)
+    pbar.close()
+    print(summary())
+    print(f"Winning responses can be found in {resultd.location}")
+
+    score_weights = [p.score_weight for p in conf.prompt]
+    print(cup.tabulate_result(podiums, score_weights).to_string(index=False))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,19 +1,32 @@
-from .tournament import (
-    single_elimination,
-    pair_matches,
-    eliminate_half,
-    run_tournament,
-    Player,
-    Podium,
-)
+from . import tournament
+from .tournament import run_tournament_async, Journal, Player, Podium, Tournament
 from .config import Config
 
-from attrs import define
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LogisticRegression
+from attrs import define, field
 
-from typing import Callable, Iterable, Protocol, cast
+import asyncio
+import random
+from abc import ABC, abstractmethod
+from math import ceil, log2
+from collections import Counter
+from functools import partial
+from types import ModuleType
+from typing import Callable, Awaitable, Iterable, AsyncIterator, Generator, Protocol
+from typing import cast, TYPE_CHECKING
+
+# pandas and numpy are imported where needed, so that the cups (and the
+# scripts using them) start without them
+if TYPE_CHECKING:
+    import pandas as pd
+    from .rating import OnlineElo
+
+type Compete = Callable[[Player, Player], tuple[Player, Player]]
+type AsyncCompete = Callable[[Player, Player], Awaitable[tuple[Player, Player]]]
+# yields groups of tournaments to run in turn, returns the final podium
+type Stages = Generator[list[Tournament], None, Podium]
+# .tournament, or .compact for simulations; the brackets are built with its
+# builders and run with its `run_tournament`
+type Engine = ModuleType
 
 
 class Cup(Protocol):
@@ -21,13 +34,21 @@ class Cup(Protocol):
         ...
 
     def run(
-        self, compete: Callable[[Player, Player], tuple[Player, Player]]
+        self,
+        compete: Compete,
+        journal: Journal | None = None,
+        engine: Engine = tournament,
     ) -> Iterable[Podium]:
         ...
 
+    def arun(
+        self, compete: AsyncCompete | Compete, journal: Journal | None = None
+    ) -> AsyncIterator[Podium]:
+        ...
+
     def tabulate_result(
         self, podiums: list[Podium], score_weights: list[float]
-    ) -> pd.DataFrame:
+    ) -> "pd.DataFrame":
         ...
 
 
@@ -40,13 +61,76 @@ def cup_factory(
         case "top3_1v1":
             return Top3_1v1(prompt_names, model_names, conf.sample, conf.top3_scores)
         case "mle_elo":
-            return MLE_Elo(prompt_names, model_names, conf.sample)
+            return MLE_Elo(prompt_names, model_names, conf.sample, conf.bootstrap)
+        case "active_elo":
+            return ActiveElo(
+                prompt_names,
+                model_names,
+                conf.sample,
+                conf.bootstrap,
+                conf.budget,
+                conf.target_ci,
+            )
+        case "swiss":
+            return Swiss(
+                prompt_names, model_names, conf.sample, conf.bootstrap, conf.rounds
+            )
         case _:
             raise ValueError(f"unknown mode: {conf.mode}")
 
 
+class StagedCup(ABC):
+    # `run` and `arun` for cups whose per-prompt brackets are given by `stages`
+    prompt_names: list[str]
+
+    @abstractmethod
+    def stages(self, prompt_name: str, engine: Engine = tournament) -> Stages:
+        ...
+
+    def run(
+        self,
+        compete: Compete,
+        journal: Journal | None = None,
+        engine: Engine = tournament,
+    ) -> Iterable[Podium]:
+        run_tournament = engine.run_tournament
+        if journal is not None:
+            assert engine is tournament, "expect the .tournament engine with a journal"
+            run_tournament = partial(run_tournament, journal=journal)
+        for pname in self.prompt_names:
+            stages = self.stages(pname, engine)
+            try:
+                while True:
+                    run_tournament(*next(stages), compete=compete)
+            except StopIteration as e:
+                yield e.value
+
+    async def arun(
+        self, compete: AsyncCompete | Compete, journal: Journal | None = None
+    ) -> AsyncIterator[Podium]:
+        # all prompts are played concurrently, podiums are yielded in order
+        async def run_prompt(pname: str) -> Podium:
+            stages = self.stages(pname)
+            try:
+                while True:
+                    tournaments = next(stages)
+                    await run_tournament_async(
+                        *tournaments, compete=compete, journal=journal
+                    )
+            except StopIteration as e:
+                return e.value
+
+        tasks = [asyncio.create_task(run_prompt(p)) for p in self.prompt_names]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
 @define
-class Top3_1v1:
+class Top3_1v1(StagedCup):
     prompt_names: list[str]
     model_names: list[str]
     nplayer: int
@@ -56,27 +140,26 @@ class Top3_1v1:
         nprompt = nprompt or len(self.prompt_names)
         return nprompt * (self.nplayer * 2 + 3)
 
-    def run(
-        self, compete: Callable[[Player, Player], tuple[Player, Player]]
-    ) -> Iterable[Podium]:
+    def stages(self, prompt_name: str, engine: Engine = tournament) -> Stages:
         assert len(self.model_names) == 2, "expect 2 models"
-        for pname in self.prompt_names:
-            ta = single_elimination(
-                [(pname, self.model_names[0], i) for i in range(self.nplayer)]
-            )
-            tb = single_elimination(
-                [(pname, self.model_names[1], i) for i in range(self.nplayer)]
-            )
-            run_tournament(ta, tb, compete=compete)
+        ta = engine.single_elimination(
+            [(prompt_name, self.model_names[0], i) for i in range(self.nplayer)]
+        )
+        tb = engine.single_elimination(
+            [(prompt_name, self.model_names[1], i) for i in range(self.nplayer)]
+        )
+        yield [ta, tb]
 
-            tp = pair_matches([ta.podium.players, tb.podium.players])
-            run_tournament(tp, compete=compete)
+        tp = engine.pair_matches([ta.podium.players, tb.podium.players])
+        yield [tp]
 
-            yield tp.podium
+        return tp.podium
 
     def tabulate_result(
         self, podiums: list[Podium], score_weights: list[float]
-    ) -> pd.DataFrame:
+    ) -> "pd.DataFrame":
+        import pandas as pd
+
         ptags: list[list] = [p.players for p in podiums]
         tb = []
         scores = [0.0] * len(self.model_names)
@@ -107,59 +190,58 @@ class Top3_1v1:
 
 
 @define
-class MLE_Elo:
+class MLE_Elo(StagedCup):
     prompt_names: list[str]
     model_names: list[str]
     nplayer: int
+    bootstrap: int = 0
 
     def nmatch(self, nprompt: int | None = None) -> int:
         nprompt = nprompt or len(self.prompt_names)
         nmodel = len(self.model_names)
         return nprompt * (self.nplayer // 4 * nmodel) * 3
 
-    def run(
-        self, compete: Callable[[Player, Player], tuple[Player, Player]]
-    ) -> Iterable[Podium]:
+    def stages(self, prompt_name: str, engine: Engine = tournament) -> Stages:
         assert self.nplayer % 4 == 0, "expect nplayer divisible by 4"
-        for pname in self.prompt_names:
-            te = [
-                eliminate_half([(pname, mname, i) for i in range(self.nplayer)])
-                for mname in self.model_names
-            ]
-            run_tournament(*te, compete=compete)
+        te = [
+            engine.eliminate_half(
+                [(prompt_name, mname, i) for i in range(self.nplayer)]
+            )
+            for mname in self.model_names
+        ]
+        yield te
 
-            tp = pair_matches([t.podium.players for t in te], return_loser=True)
-            run_tournament(tp, compete=compete)
+        tp = engine.pair_matches([t.podium.players for t in te], return_loser=True)
+        yield [tp]
 
-            yield tp.podium
+        return tp.podium
+
+    @staticmethod
+    def pairwise_outcomes(podium: Podium) -> list[tuple[Player, Player]]:
+        # (winner, loser) of each final match; the podium is winners then losers
+        n = len(podium.players) // 2
+        return list(zip(podium.players[:n], podium.players[n:]))
 
     def tabulate_result(
         self, podiums: list[Podium], score_weights: list[float]
-    ) -> pd.DataFrame:
-        SCALE, BASE, INIT_RATING = 400, 10, 1000
-        nmatch_per_prompt = len(podiums[0].players) // 2
-        nentry = len(podiums) * nmatch_per_prompt
+    ) -> "pd.DataFrame":
+        import pandas as pd
+        import numpy as np
+        from .rating import bootstrap_elo, fit_bt, to_elo
+
+        outcomes = [self.pairwise_outcomes(p) for p in podiums]
         nmodel = len(self.model_names)
-        x = np.zeros((nentry, nmodel))
-        y = np.zeros(nentry)
+        wins = np.zeros((nmodel, nmodel))
 
         tb = []
         mname2idx = {m: i for i, m in enumerate(self.model_names)}
-        i = 0
-        for podium in podiums:
+        for podium, pairs, weight in zip(podiums, outcomes, score_weights):
             stat = np.zeros((nmodel, 2), dtype=int)
-            for idw, idl in zip(
-                podium.players[:nmatch_per_prompt], podium.players[nmatch_per_prompt:]
-            ):
+            for idw, idl in pairs:
                 j1, j2 = mname2idx[cast(tuple, idw)[1]], mname2idx[cast(tuple, idl)[1]]
                 stat[j1, 0] += 1
                 stat[j2, 1] += 1
-                if i % 2 == 0:  # let j1 be the loser
-                    j1, j2 = j2, j1
-                x[i, j1] = +np.log(BASE)
-                x[i, j2] = -np.log(BASE)
-                y[i] = i % 2
-                i += 1
+                wins[j1, j2] += weight
             ptag: list = podium.players
             tb.append(
                 {
@@ -168,13 +250,169 @@ class MLE_Elo:
                 }
             )
 
-        lr = LogisticRegression(fit_intercept=False)
-        lr.fit(x, y, sample_weight=np.repeat(score_weights, nmatch_per_prompt))
-        elo_scores = np.round(SCALE * lr.coef_[0] + INIT_RATING)
+        elo_scores = np.round(to_elo(fit_bt(wins)))
         tb.append(
             {
                 "Prompt": "Elo rating",
                 **{m: s for m, s in zip(self.model_names, elo_scores)},
             }
         )
+        if self.bootstrap:
+            idx = [
+                [(mname2idx[a[1]], mname2idx[b[1]]) for a, b in pairs]  # type: ignore
+                for pairs in outcomes
+            ]
+            samples = bootstrap_elo(idx, score_weights, nmodel, self.bootstrap)
+            lo, hi = np.round(np.percentile(samples, [2.5, 97.5], axis=0))
+            tb.append(
+                {
+                    "Prompt": "95% CI",
+                    **{
+                        m: f"{a:.0f}~{b:.0f}"
+                        for m, a, b in zip(self.model_names, lo, hi)
+                    },
+                }
+            )
         return pd.DataFrame(tb)
+
+
+@define
+class ActiveElo(MLE_Elo):
+    # picks each next match by expected information gain on the ratings, which
+    # are shared across prompts; a prompt stops after `budget` matches, once
+    # every rating's 95% CI is within ±`target_ci` Elo points, or when every
+    # pair of responses has met
+    budget: int = 0  # 0 for as many as MLE_Elo plays per prompt
+    target_ci: float = 0.0
+    ratings: "OnlineElo" = field(init=False)
+    _replay: dict[str, list[tuple[Player, Player]]] = field(init=False, factory=dict)
+    _played: Counter = field(init=False, factory=Counter)  # matches per prompt
+    _stopped: set[str] = field(init=False, factory=set)
+
+    def __attrs_post_init__(self):
+        self.budget = self.budget or super().nmatch(1)
+        from .rating import OnlineElo
+
+        self.ratings = OnlineElo(self.model_names)
+
+    def nmatch(self, nprompt: int | None = None) -> int:
+        if nprompt is not None:
+            return nprompt * self.budget
+        # matches left to play may shrink as ratings get confident
+        reached = self._target_reached()
+        return sum(
+            self._played[p]
+            if p in self._stopped
+            else max(1, self._played[p])
+            if reached
+            else self.budget
+            for p in self.prompt_names
+        )
+
+    def _target_reached(self) -> bool:
+        return bool(self.target_ci) and self.ratings.ci().max() <= self.target_ci
+
+    def observe(self, winner: Player, loser: Player):
+        self.ratings.record(winner[1], loser[1])  # type: ignore
+
+    def resume(
+        self, podiums: Iterable[Podium], outcomes: Iterable[tuple[Player, Player]]
+    ):
+        # learn from completed prompts, and replay the decisions journaled for
+        # the ones in progress before picking new matches
+        for podium in podiums:
+            for winner, loser in self.pairwise_outcomes(podium):
+                self.observe(winner, loser)
+        for winner, loser in outcomes:
+            self._replay.setdefault(winner[0], []).append((winner, loser))  # type: ignore
+
+    def _pick(self, prompt_name: str, seen: Counter, met: set) -> tuple | None:
+        # the least shown responses of the most informative pair of models
+        # that have not met yet
+        def players(k: int) -> list[Player]:
+            return [(prompt_name, self.model_names[k], i) for i in range(self.nplayer)]
+
+        exhausted = set()
+        while (ks := self.ratings.most_informative(exhausted)) is not None:
+            pa, pb = players(ks[0]), players(ks[1])
+            pairs = [(a, b) for a in pa for b in pb if frozenset((a, b)) not in met]
+            if pairs:
+                return min(pairs, key=lambda ab: (seen[ab[0]] + seen[ab[1]], *ab))
+            exhausted.add(ks)
+        return None
+
+    def stages(self, prompt_name: str, engine: Engine = tournament) -> Stages:
+        seen, met = Counter(), set()
+        winners, losers = [], []
+
+        def play(t: Tournament):
+            winner, loser = t.podium.players
+            self.observe(winner, loser)
+            seen.update((winner, loser))
+            met.add(frozenset((winner, loser)))
+            winners.append(winner)
+            losers.append(loser)
+            self._played[prompt_name] += 1
+
+        for pair in self._replay.pop(prompt_name, [])[: self.budget]:
+            t = engine.fixed_pairs([pair], return_loser=True)  # answered by the journal
+            yield [t]
+            play(t)
+        while len(winners) < self.budget:
+            if winners and self._target_reached():
+                break
+            if (pair := self._pick(prompt_name, seen, met)) is None:
+                break
+            t = engine.fixed_pairs([pair], return_loser=True)
+            yield [t]
+            play(t)
+        self._stopped.add(prompt_name)
+        return Podium(winners + losers)
+
+
+@define
+class Swiss(MLE_Elo):
+    # Swiss-system rounds between models: each round pairs models of equal or
+    # close scores that have not met yet, with a bye for the lowest-scored one
+    # if the count is odd; nmodel // 2 matches a round, for about log2(nmodel)
+    # rounds per prompt
+    rounds: int = 0  # 0 for ceil(log2(nmodel))
+
+    def __attrs_post_init__(self):
+        self.rounds = self.rounds or max(1, ceil(log2(len(self.model_names))))
+
+    def nmatch(self, nprompt: int | None = None) -> int:
+        nprompt = nprompt or len(self.prompt_names)
+        return nprompt * (len(self.model_names) // 2) * self.rounds
+
+    def stages(self, prompt_name: str, engine: Engine = tournament) -> Stages:
+        order = list(self.model_names)
+        random.Random(prompt_name).shuffle(order)  # same pairings when resumed
+        score = dict.fromkeys(order, 0)
+        met: dict[str, set[str]] = {m: set() for m in order}
+        had_bye = set()
+        winners, losers = [], []
+        for r in range(self.rounds):
+            ranked = sorted(order, key=score.__getitem__, reverse=True)
+            if len(ranked) % 2:
+                bye = next((m for m in ranked[::-1] if m not in had_bye), ranked[-1])
+                had_bye.add(bye)
+                score[bye] += 1
+                ranked.remove(bye)
+            pairs = []
+            while ranked:
+                a = ranked.pop(0)
+                b = next((m for m in ranked if m not in met[a]), ranked[0])
+                ranked.remove(b)
+                met[a].add(b)
+                met[b].add(a)
+                i = r % self.nplayer
+                pairs.append(((prompt_name, a, i), (prompt_name, b, i)))
+            t = engine.fixed_pairs(pairs, return_loser=True)
+            yield [t]
+
+            for winner, loser in self.pairwise_outcomes(t.podium):
+                score[winner[1]] += 1  # type: ignore
+                winners.append(winner)
+                losers.append(loser)
+        return Podium(winners + losers)
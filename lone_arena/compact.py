@@ -0,0 +1,193 @@
+# Array-backed drop-in for the builders and `run_tournament` in .tournament,
+# for running many simulated tournaments cheaply (`cup.run(..., engine=compact)`,
+# as simulate.py does); it has no journal. Players are stored once and
+# referred to by index; each match owns two consecutive slots, and the podium
+# owns a block of slots.
+from .tournament import Podium, Player
+
+from attrs import define, Factory, NOTHING as TBD
+
+from math import log2
+from array import array
+from itertools import chain, combinations
+import random
+from typing import Callable, Iterable
+
+EMPTY = -1
+
+
+@define
+class Tournament:
+    players: list[Player]
+    slots: array = Factory(lambda: array("l"))  # player index, or EMPTY
+    slot_match: array = Factory(lambda: array("l"))  # owning match, or EMPTY
+    match_base: array = Factory(lambda: array("l"))  # first slot of each match
+    winner_to: array = Factory(lambda: array("l"))  # destination slot, or EMPTY
+    loser_to: array = Factory(lambda: array("l"))
+    podium_base: int = 0
+    podium_size: int = 0
+
+    def _alloc(self, n: int, match: int = EMPTY) -> int:
+        base = len(self.slots)
+        self.slots.extend([EMPTY] * n)
+        self.slot_match.extend([match] * n)
+        return base
+
+    def _podium(self, n: int) -> int:
+        self.podium_base, self.podium_size = self._alloc(n), n
+        return self.podium_base
+
+    def _match(self, winner_to: int = EMPTY, loser_to: int = EMPTY) -> int:
+        k = len(self.match_base)
+        self.match_base.append(self._alloc(2, k))
+        self.winner_to.append(winner_to)
+        self.loser_to.append(loser_to)
+        return k
+
+    def _matches(
+        self,
+        pairs: list[tuple[int, int]],
+        winner_to: Iterable[int],
+        loser_to: Iterable[int],
+    ):
+        # bulk version of `_match` + `_seat`
+        base, k0 = len(self.slots), len(self.match_base)
+        self.slots.extend(chain.from_iterable(pairs))
+        self.slot_match.extend(k0 + i // 2 for i in range(2 * len(pairs)))
+        self.match_base.extend(range(base, base + 2 * len(pairs), 2))
+        self.winner_to.extend(winner_to)
+        self.loser_to.extend(loser_to)
+
+    def _seat(self, k: int, a: int, b: int):
+        base = self.match_base[k]
+        self.slots[base], self.slots[base + 1] = a, b
+
+    def _is_ready(self, k: int) -> bool:
+        base = self.match_base[k]
+        return self.slots[base] != EMPTY and self.slots[base + 1] != EMPTY
+
+    @property
+    def init_matches(self) -> list[int]:
+        return [k for k in range(len(self.match_base)) if self._is_ready(k)]
+
+    @property
+    def podium(self) -> Podium:
+        slots = self.slots[self.podium_base : self.podium_base + self.podium_size]
+        return Podium(players=[TBD if i == EMPTY else self.players[i] for i in slots])
+
+
+def run_tournament(
+    *tournaments: Tournament,
+    compete: Callable[[Player, Player], tuple[Player, Player]],
+):
+    ready = [(t, k) for t in tournaments for k in t.init_matches]
+    while ready:
+        i = random.randrange(len(ready))
+        ready[i], ready[-1] = ready[-1], ready[i]
+        t, k = ready.pop()
+        base = t.match_base[k]
+        a, b = t.slots[base], t.slots[base + 1]
+        if random.getrandbits(1):
+            a, b = b, a
+        winner, _ = compete(t.players[a], t.players[b])
+        if winner != t.players[a]:
+            a, b = b, a
+        for dest, v in ((t.winner_to[k], a), (t.loser_to[k], b)):
+            if dest == EMPTY:
+                continue
+            t.slots[dest] = v
+            m = t.slot_match[dest]
+            if m != EMPTY and t._is_ready(m):
+                ready.append((t, m))
+
+
+def single_elimination(players: list[Player]) -> Tournament:
+    nplayer = len(players)
+    assert log2(nplayer).is_integer(), "expect 2^n players"
+
+    t = Tournament(list(players))
+    top3 = t._podium(3)
+    final = t._match(top3, top3 + 1)
+    loser_final = t._match(top3 + 2)
+    leaves = [
+        t._match(t.match_base[final] + i, t.match_base[loser_final] + i)
+        for i in range(2)
+    ]
+    while len(leaves) * 2 < nplayer:
+        leaves = [t._match(t.match_base[m] + i) for m in leaves for i in range(2)]
+
+    for i in range(0, nplayer, 2):
+        t._seat(leaves[i // 2], i, i + 1)
+    return t
+
+
+def eliminate_half(players: list[Player]) -> Tournament:
+    n = len(players)
+    assert n % 2 == 0, "expect even number of players"
+
+    t = Tournament(list(players))
+    winners = t._podium(n // 2)
+    t._matches(
+        [(2 * i, 2 * i + 1) for i in range(n // 2)],
+        range(winners, winners + n // 2),
+        [EMPTY] * (n // 2),
+    )
+    return t
+
+
+def pair_matches(
+    players: list[list[Player]], *, return_loser: bool = False
+) -> Tournament:
+    t = Tournament([p for group in players for p in group])
+    groups, offset = [], 0
+    for group in players:
+        groups.append(list(range(offset, offset + len(group)))[::-1])
+        offset += len(group)
+    mgroup = len(groups)
+    nplayer = len(groups[0])
+    n_match = mgroup * nplayer // 2
+
+    p = t._podium(n_match * 2 if return_loser else n_match)
+    pairs = []
+    # regular pairs
+    idx = 0
+    n_match_type = mgroup * (mgroup - 1) // 2
+    for i, j in combinations(range(mgroup), 2):
+        for _ in range(n_match // n_match_type):
+            pairs.append((groups[i].pop(), groups[j].pop()))
+            idx += 1
+    # remaining pairs
+    i, j = 0, 1
+    while idx < n_match:
+        while not groups[i]:
+            i = (i + 1) % mgroup
+        pi = groups[i].pop()
+        while not groups[j]:
+            j = (j + 1) % mgroup
+        pj = groups[j].pop()
+        if i == j:
+            raise RuntimeError("a remaining pair is from the same group")
+        pairs.append((pi, pj))
+        idx += 1
+        i, j = (i + 1) % mgroup, (j + 1) % mgroup
+
+    loser_to = (
+        range(p + n_match, p + 2 * n_match) if return_loser else [EMPTY] * n_match
+    )
+    t._matches(pairs, range(p, p + n_match), loser_to)
+    return t
+
+
+def fixed_pairs(
+    pairs: list[tuple[Player, Player]], *, return_loser: bool = False
+) -> Tournament:
+    t = Tournament([p for pair in pairs for p in pair])
+    n_match = len(pairs)
+    p = t._podium(n_match * 2 if return_loser else n_match)
+    loser_to = (
+        range(p + n_match, p + 2 * n_match) if return_loser else [EMPTY] * n_match
+    )
+    t._matches(
+        [(2 * i, 2 * i + 1) for i in range(n_match)], range(p, p + n_match), loser_to
+    )
+    return t
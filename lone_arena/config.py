@@ -12,6 +12,8 @@ cattrs.register_structure_hook(Path, lambda d, t: t(d))
 @define
 class Model:
     name: str
+    # max concurrent requests to this model's endpoint, overrides --batch-size
+    concurrency: int | None = None
     # params for openai.OpenAI and openai.OpenAI.chat.completion.create
     openai_params: dict[str, Any] = Factory(dict)
 
@@ -19,6 +21,7 @@ class Model:
     def from_dict(cls, d):
         return cls(
             name=d.pop("name"),
+            concurrency=d.pop("concurrency", None),
             openai_params=d,
         )
 
@@ -26,6 +29,16 @@ class Model:
 cattrs.register_structure_hook(Model, lambda d, t: t.from_dict(d))
 
 
+def split_params(params: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
+    # into params for openai.OpenAI and for chat.completions.create
+    params = params.copy()
+    client_params = {}
+    for k in ["api_key", "organization", "base_url", "timeout", "max_retries"]:
+        if k in params:
+            client_params[k] = params.pop(k)
+    return client_params, params
+
+
 @define
 class Prompt:
     name: str
@@ -36,9 +49,15 @@ class Prompt:
 @define
 class Config:
     data_dir: Path = Path("./data")
+    store: str = "files"  # or "sqlite"
     mode: str = "UNSET"
     sample: int = 8
     top3_scores: tuple[float, float, float] = (4.8, 3.2, 2.0)
+    bootstrap: int = 0  # rounds for Elo confidence intervals, 0 to skip
+    budget: int = 0  # active_elo: max matches per prompt
+    target_ci: float = 0.0  # active_elo: stop once 95% CIs are within ±target_ci
+    rounds: int = 0  # swiss: rounds per prompt, 0 for ceil(log2(number of models))
+    judge: Model | None = None  # LLM for automated judging
     model: list[Model] = Factory(list)
     prompt: list[Prompt] = Factory(list)
 
@@ -1,13 +1,123 @@
 from .tournament import Podium, Player
 
-from attrs import define
+from attrs import define, field
 
 from pathlib import Path
 from functools import cached_property
+from collections import OrderedDict
+from collections.abc import Mapping, Iterator
+from array import array
+from typing import Any, TextIO
+import threading
+import hashlib
 import json
+import mmap
 
 type Messages = list[dict]
-type Documents = dict[Player, Messages]
+type Documents = Mapping[Player, Messages]
+
+
+@define(slots=False)
+class IndexedJsonl:
+    # random access to lines of a jsonl file, via a byte-offset index stored
+    # next to it and rebuilt whenever the file's size or mtime changes
+    path: Path
+
+    @cached_property
+    def index_path(self) -> Path:
+        return self.path.with_suffix(".idx")
+
+    @cached_property
+    def offsets(self) -> array:
+        st = self.path.stat()
+        idx = array("Q")
+        try:
+            idx.frombytes(self.index_path.read_bytes())
+            if idx[:2] == array("Q", [st.st_size, st.st_mtime_ns]):
+                return idx[2:]
+        except (OSError, ValueError):
+            pass
+        offsets = array("Q", [0])
+        with self.path.open("rb") as fi:
+            for line in fi:
+                if not line.endswith(b"\n"):
+                    break  # partial line of an interrupted write
+                offsets.append(offsets[-1] + len(line))
+        try:
+            tmp = self.index_path.with_suffix(".idx.tmp")
+            tmp.write_bytes(
+                (array("Q", [st.st_size, st.st_mtime_ns]) + offsets).tobytes()
+            )
+            tmp.replace(self.index_path)
+        except OSError:
+            pass  # read-only data dir, index only in memory
+        return offsets
+
+    @cached_property
+    def _buf(self) -> mmap.mmap | bytes:
+        if self.offsets[-1] == 0:
+            return b""  # mmap can't map an empty file
+        with self.path.open("rb") as fi:
+            return mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def read(self, i: int) -> Any:
+        return json.loads(self._buf[self.offsets[i] : self.offsets[i + 1]])
+
+
+@define(slots=False)
+class LazyDocuments(Mapping):
+    # parse responses on access, keeping the `cache_size` most recently used
+    doc_dir: Path
+    prompt_names: list[str]
+    model_names: list[str]
+    cache_size: int = 64
+    _files: dict[tuple[str, str], IndexedJsonl] = field(init=False, factory=dict)
+    _cache: OrderedDict = field(init=False, factory=OrderedDict)
+    _lock: threading.Lock = field(init=False, factory=threading.Lock)
+
+    def _file(self, pname: str, mname: str) -> IndexedJsonl:
+        if (f := self._files.get((pname, mname))) is None:
+            f = IndexedJsonl(self.doc_dir / pname / f"{mname}.jsonl")
+            self._files[(pname, mname)] = f
+        return f
+
+    def __getitem__(self, key: Player) -> Messages:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            try:
+                pname, mname, i = key  # type: ignore
+            except (TypeError, ValueError):
+                raise KeyError(key)
+            if pname not in self.prompt_names or mname not in self.model_names:
+                raise KeyError(key)
+            f = self._file(pname, mname)
+            if not (isinstance(i, int) and 0 <= i < len(f)):
+                raise KeyError(key)
+            msg = self._cache[key] = f.read(i)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return msg
+
+    def __iter__(self) -> Iterator[Player]:
+        for pname in self.prompt_names:
+            for mname in self.model_names:
+                with self._lock:
+                    n = len(self._file(pname, mname))
+                for i in range(n):
+                    yield (pname, mname, i)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(
+                len(self._file(pname, mname))
+                for pname in self.prompt_names
+                for mname in self.model_names
+            )
 
 
 @define(slots=False)
@@ -21,13 +131,12 @@ class DocumentDir:
         return d
 
     def load(self, prompt_names: list[str], model_names: list[str]) -> Documents:
-        docs = {}
         for pname in prompt_names:
             for mname in model_names:
-                with (self.doc_dir / pname / f"{mname}.jsonl").open("r") as fi:
-                    for i, line in enumerate(fi):
-                        docs[(pname, mname, i)] = json.loads(line)
-        return docs
+                path = self.doc_dir / pname / f"{mname}.jsonl"
+                if not path.exists():
+                    raise FileNotFoundError(f"missing responses: {path}")
+        return LazyDocuments(self.doc_dir, prompt_names, model_names)
 
     def dump(self, msg_list: list[Messages], prompt_name: str, model_name: str):
         pdir = self.doc_dir / prompt_name
@@ -37,6 +146,40 @@ class DocumentDir:
                 json.dump(msg, fo, ensure_ascii=False)
                 print(file=fo)
 
+    def append(self, msg: Messages, prompt_name: str, model_name: str):
+        pdir = self.doc_dir / prompt_name
+        pdir.mkdir(exist_ok=True)
+        with (pdir / f"{model_name}.jsonl").open("a") as fo:
+            print(json.dumps(msg, ensure_ascii=False), file=fo)
+
+    def count(self, prompt_name: str, model_name: str) -> int:
+        path = self.doc_dir / prompt_name / f"{model_name}.jsonl"
+        if not path.exists():
+            return 0
+        return path.read_bytes().count(b"\n")  # a partial last line doesn't count
+
+    def repair(self, prompt_name: str, model_name: str):
+        # drop the partial line of an interrupted write, before appending more
+        path = self.doc_dir / prompt_name / f"{model_name}.jsonl"
+        if not path.exists():
+            return
+        with path.open("r+b") as f:
+            data = f.read()
+            if (end := data.rfind(b"\n") + 1) < len(data):
+                f.truncate(end)
+
+
+def is_current(
+    podium: Podium, model_names: list[str] | None, played: list[str] | None = None
+) -> bool:
+    # a result from before models were added or removed is played again;
+    # `played` are the models it was played with, recorded since this check
+    if model_names is None:
+        return True
+    if played is None:  # older result, tell from the models on its podium
+        played = [p[1] for p in podium.players]  # type: ignore
+    return set(played) == set(model_names)
+
 
 @define(slots=False)
 class ResultDir:
@@ -48,15 +191,180 @@ class ResultDir:
         d.mkdir(exist_ok=True, parents=True)
         return d
 
-    def load(self, prompt_names: list[str]) -> tuple[list[Podium], list[str]]:
+    @property
+    def location(self) -> str:
+        return str(self.result_dir)
+
+    @cached_property
+    def _models_path(self) -> Path:
+        return self.result_dir / ".models.json"
+
+    def played_models(self, prompt_name: str) -> list[str] | None:
+        if not self._models_path.exists():
+            return None
+        return json.loads(self._models_path.read_text()).get(prompt_name)
+
+    def load(
+        self, prompt_names: list[str], model_names: list[str] | None = None
+    ) -> tuple[list[Podium], list[str]]:
         podiums = []
         pnames_todo = []
         for pname in prompt_names:
-            if (self.result_dir / f"{pname}.json").exists():
-                podiums.append(Podium.load_from(self.result_dir / f"{pname}.json"))
+            path = self.result_dir / f"{pname}.json"
+            if path.exists() and is_current(
+                podium := Podium.load_from(path),
+                model_names,
+                self.played_models(pname),
+            ):
+                podiums.append(podium)
             else:
                 pnames_todo.append(pname)
         return podiums, pnames_todo
 
-    def dump(self, podium: Podium, docs: Documents, prompt_name: str):
+    def dump(
+        self,
+        podium: Podium,
+        docs: Documents,
+        prompt_name: str,
+        model_names: list[str] | None = None,
+    ):
         podium.dump(self.result_dir / f"{prompt_name}.json", docs)
+        if model_names is None:
+            return
+        played = (
+            json.loads(self._models_path.read_text())
+            if self._models_path.exists()
+            else {}
+        )
+        played[prompt_name] = list(model_names)
+        tmp = self._models_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(played, ensure_ascii=False, indent=2))
+        tmp.replace(self._models_path)
+
+
+@define(slots=False)
+class MatchJournal:
+    # per-prompt log of decisions as they are made, replayed by run_tournament
+    # to resume an interrupted prompt; players are (prompt, model, index)
+    data_dir: Path
+    _outcomes: dict[frozenset, tuple[Player, Player]] = field(init=False, factory=dict)
+    _pending: dict[frozenset, tuple[Player, Player]] = field(init=False, factory=dict)
+    _loaded: set[str] = field(init=False, factory=set)
+    _files: dict[str, TextIO] = field(init=False, factory=dict)
+
+    @cached_property
+    def journal_dir(self) -> Path:
+        d = self.data_dir / "journal"
+        d.mkdir(exist_ok=True, parents=True)
+        return d
+
+    def _load(self, pname: str):
+        if pname in self._loaded:
+            return
+        self._loaded.add(pname)
+        path = self.journal_dir / f"{pname}.jsonl"
+        if not path.exists():
+            return
+        with path.open("r") as fi:
+            for line in fi:
+                try:
+                    e = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # partial line of an interrupted write
+                if "ask" in e:
+                    a, b = map(tuple, e["ask"])
+                    self._pending[frozenset((a, b))] = (a, b)
+                else:
+                    self._remember(tuple(e["win"]), tuple(e["lose"]))
+
+    def _remember(self, winner: Player, loser: Player):
+        key = frozenset((winner, loser))
+        self._outcomes[key] = (winner, loser)
+        self._pending.pop(key, None)
+
+    def _append(self, pname: str, entry: dict):
+        if (fo := self._files.get(pname)) is None:
+            fo = self._files[pname] = (self.journal_dir / f"{pname}.jsonl").open("a")
+        print(json.dumps(entry, ensure_ascii=False), file=fo, flush=True)
+
+    def lookup(self, a: Player, b: Player) -> tuple[Player, Player] | None:
+        self._load(a[0])  # type: ignore
+        return self._outcomes.get(frozenset((a, b)))
+
+    def pending(self, a: Player, b: Player) -> tuple[Player, Player] | None:
+        self._load(a[0])  # type: ignore
+        return self._pending.get(frozenset((a, b)))
+
+    def ask(self, a: Player, b: Player):
+        self._pending[frozenset((a, b))] = (a, b)
+        self._append(a[0], {"ask": [a, b]})  # type: ignore
+
+    def record(self, winner: Player, loser: Player):
+        self._remember(winner, loser)
+        self._append(winner[0], {"win": winner, "lose": loser})  # type: ignore
+
+    def outcomes(self, prompt_names: list[str]) -> list[tuple[Player, Player]]:
+        for pname in prompt_names:
+            self._load(pname)
+        pset = set(prompt_names)
+        return [o for o in self._outcomes.values() if o[0][0] in pset]  # type: ignore
+
+    def count(self, prompt_names: list[str]) -> int:
+        return len(self.outcomes(prompt_names))
+
+    def discard(self, prompt_name: str):
+        if (fo := self._files.pop(prompt_name, None)) is not None:
+            fo.close()
+        (self.journal_dir / f"{prompt_name}.jsonl").unlink(missing_ok=True)
+        for d in (self._outcomes, self._pending):
+            for k, (a, _) in list(d.items()):
+                if a[0] == prompt_name:  # type: ignore
+                    del d[k]
+
+
+@define(slots=False)
+class CacheDir:
+    data_dir: Path
+    namespace: str
+
+    @cached_property
+    def cache_dir(self) -> Path:
+        d = self.data_dir / "cache" / self.namespace
+        d.mkdir(exist_ok=True, parents=True)
+        return d
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        s = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(s.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Any | None:
+        path = self._path(key)
+        try:
+            value = json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        path.touch()  # mark as recently used
+        return value
+
+    def put(self, key: str, value: Any):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(value, ensure_ascii=False))
+        tmp.replace(path)
+
+    def evict(self, max_bytes: int) -> int:
+        entries = [(p.stat(), p) for p in self.cache_dir.glob("*/*.json")]
+        total = sum(st.st_size for st, _ in entries)
+        nevicted = 0
+        for st, p in sorted(entries, key=lambda e: e[0].st_mtime):
+            if total <= max_bytes:
+                break
+            p.unlink()
+            total -= st.st_size
+            nevicted += 1
+        return nevicted
@@ -0,0 +1,162 @@
+from .chatcup import AsyncCompete
+from .config import Model, split_params
+from .files import CacheDir, Documents, Messages
+from .retry import MAX_ATTEMPTS, backoff_delay, overload_errors, retry_after
+from .store import content_hash
+from .tournament import Player
+
+from attrs import define, field
+
+from functools import cached_property
+from typing import Any, Callable, TYPE_CHECKING
+import asyncio
+import random
+import re
+
+if TYPE_CHECKING:
+    import openai
+
+JUDGE_SYSTEM = """\
+Please act as an impartial judge and evaluate the quality of two responses from \
+AI assistants to the conversation shown below. Choose the response that better \
+follows the user's instructions and answers the user's question. Do not let the \
+order in which the responses are presented, their length, or the assistants' \
+names influence your decision. After a short explanation, output your final \
+verdict strictly in this format: "[[A]]" if response A is better, "[[B]]" if \
+response B is better."""
+VERDICT = re.compile(r"\[\[([AB])\]\]")
+
+
+def judge_messages(a: Messages, b: Messages) -> list[dict]:
+    context = "\n\n".join(f"{e['role']}: {e['content']}" for e in a[:-1])
+    return [
+        {"role": "system", "content": JUDGE_SYSTEM},
+        {
+            "role": "user",
+            "content": f"[Conversation]\n{context}\n\n"
+            f"[Response A]\n{a[-1]['content']}\n\n"
+            f"[Response B]\n{b[-1]['content']}",
+        },
+    ]
+
+
+@define(slots=False)
+class VerdictCache:
+    # verdicts keyed by the prompt and the content of the two responses, in
+    # whichever order they were shown; survives changes to the model list
+    cache: CacheDir
+    docs: Documents
+    context: Any = None  # anything else the verdict depends on
+    hits: int = 0
+    # verdicts being asked, done once they are in the cache
+    _asking: dict[str, asyncio.Future] = field(init=False, factory=dict)
+
+    def _key(self, a: Player, b: Player) -> tuple[str, str, str]:
+        ha, hb = content_hash(self.docs[a]), content_hash(self.docs[b])
+        return CacheDir.key(self.context, a[0], sorted([ha, hb])), ha, hb  # type: ignore
+
+    def get(self, a: Player, b: Player) -> tuple[Player, Player] | None:
+        key, ha, hb = self._key(a, b)
+        if ha == hb:
+            return a, b  # nothing to tell apart
+        if (v := self.cache.get(key)) is None:
+            return None
+        return (a, b) if v["winner"] == ha else (b, a)
+
+    def put(self, winner: Player, loser: Player):
+        key, hw, _ = self._key(winner, loser)
+        self.cache.put(key, {"winner": hw})
+
+    def wrap(
+        self, compete: AsyncCompete, on_hit: Callable[[], Any] | None = None
+    ) -> AsyncCompete:
+        async def cached(a: Player, b: Player) -> tuple[Player, Player]:
+            # a pair already being asked waits for that verdict, and asks
+            # again only if it failed
+            while (outcome := self.get(a, b)) is None:
+                key, _, _ = self._key(a, b)
+                if (asking := self._asking.get(key)) is None:
+                    break
+                await asyncio.wait([asking])
+            else:
+                self.hits += 1
+                if on_hit is not None:
+                    on_hit()
+                return outcome
+            asking = self._asking[key] = asyncio.get_running_loop().create_future()
+            try:
+                outcome = await compete(a, b)
+                self.put(*outcome)
+            finally:
+                del self._asking[key]
+                asking.set_result(None)
+            return outcome
+
+        return cached
+
+
+@define(slots=False)
+class LLMJudge:
+    # an async `compete` backed by a chat model, shown the pair in random order;
+    # wrap it with a VerdictCache of `context` to reuse verdicts
+    model: Model
+    docs: Documents
+    concurrency: int = 8  # unless set on the model
+    calls: int = 0
+    retries: int = 0  # of overloaded requests
+    invalid: int = 0  # unparsable verdicts, decided by a coin flip
+    _semaphore: asyncio.Semaphore = field(init=False)
+
+    def __attrs_post_init__(self):
+        self._semaphore = asyncio.Semaphore(self.model.concurrency or self.concurrency)
+
+    @cached_property
+    def _params(self) -> tuple[dict, dict]:
+        return split_params(self.model.openai_params)
+
+    @cached_property
+    def client(self) -> "openai.AsyncOpenAI":
+        import openai
+
+        # retries are paced in `__call__`
+        return openai.AsyncOpenAI(**{"max_retries": 0, **self._params[0]})
+
+    @property
+    def context(self) -> Any:
+        client_params, completion_params = self._params
+        return [
+            {"base_url": client_params.get("base_url"), **completion_params},
+            JUDGE_SYSTEM,
+        ]
+
+    async def __call__(self, a: Player, b: Player) -> tuple[Player, Player]:
+        first, second = random.sample([a, b], 2)  # against position bias
+        overload, attempt = overload_errors(), 0
+        while True:
+            try:
+                async with self._semaphore:
+                    self.calls += 1
+                    rsp = await self.client.chat.completions.create(
+                        messages=judge_messages(self.docs[first], self.docs[second]),  # type: ignore
+                        **self._params[1],
+                    )
+                break
+            except overload as e:
+                attempt += 1
+                if attempt >= MAX_ATTEMPTS:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(backoff_delay(attempt, retry_after(e)))
+        content = rsp.choices[0].message.content or ""
+        if m := VERDICT.findall(content):
+            winner = first if m[-1] == "A" else second
+        else:
+            self.invalid += 1
+            winner = random.choice([a, b])
+        return (a, b) if winner == a else (b, a)
+
+    def summary(self) -> str:
+        return (
+            f"judge: {self.calls} requests, {self.retries} retried, "
+            f"{self.invalid} unparsable"
+        )
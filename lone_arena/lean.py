@@ -0,0 +1,137 @@
+from .files import Messages
+from .scheduler import MatchScheduler
+from .tournament import Player
+
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse
+from markdown_it import MarkdownIt
+from pydantic import BaseModel
+
+from functools import lru_cache
+from html import escape
+from typing import Callable
+
+# responses are untrusted: raw HTML in them is shown as text, not rendered
+_md = MarkdownIt("commonmark", {"breaks": True, "html": False})
+
+
+def to_html(conv: Messages) -> str:
+    # like format_conversation, with earlier turns greyed out
+    parts = []
+    for i, e in enumerate(conv):
+        style = "" if i == len(conv) - 1 else " style='color: #aaaaaa'"
+        parts.append(
+            f"<div{style}><b><code>{escape(str(e['role']))}</code></b>"
+            f"{_md.render(str(e['content']))}</div>"
+        )
+    return "".join(parts)
+
+
+class Verdict(BaseModel):
+    session: str
+    choice: int | None = None  # None to (re)fetch the current pair
+
+
+def lean_app(scheduler: MatchScheduler, render: Callable[[Player], str]) -> FastAPI:
+    # one round trip per decision: post the verdict, get the next pair back;
+    # `render` gives a document as HTML, the scheduler's own rendering being
+    # for the gradio UI
+    app = FastAPI()
+    render = lru_cache(maxsize=scheduler.cache_size)(render)
+
+    @app.get("/", response_class=HTMLResponse)
+    def page():
+        return PAGE
+
+    @app.post("/api/judge")
+    def judge(v: Verdict):
+        if v.choice is not None:
+            scheduler.decide(v.session, v.choice)
+        ticket = scheduler.next(v.session)
+        pair = tuple(map(render, ticket.players)) if ticket is not None else None
+        return {
+            "pair": pair,
+            "message": scheduler.message,
+            "completed": scheduler.completed,
+            "total": scheduler.total,
+        }
+
+    @app.post("/api/release")
+    def release(v: Verdict):
+        scheduler.release(v.session)
+
+    return app
+
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Lone Arena</title>
+<style>
+body { font-family: sans-serif; margin: 1em auto; max-width: 80em; }
+#row { display: flex; gap: 1em; }
+.col { flex: 1; border: 1px solid #ddd; border-radius: 6px; padding: 0 1em 1em; }
+.col > div { min-height: 8em; }
+button { width: 100%; margin: 1em 0 0; padding: .6em; font-size: 1em; }
+progress { width: 100%; }
+</style>
+</head>
+<body>
+<progress id="progress" value="0" max="1"></progress>
+<h2>Which of the two responses is better?</h2>
+<div id="row">
+  <div class="col"><button id="choose1">👇This one's better [f]</button><div id="doc1"></div></div>
+  <div class="col"><button id="choose2">👇This one's better [j]</button><div id="doc2"></div></div>
+</div>
+<script>
+let session = sessionStorage.getItem("session");
+if (!session) {
+    session = crypto.randomUUID();
+    sessionStorage.setItem("session", session);
+}
+let busy = false;
+async function judge(choice) {
+    if (busy) return;
+    busy = true;
+    try {
+        const rsp = await fetch("api/judge", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({session, choice}),
+        });
+        const r = await rsp.json();
+        const done = r.pair === null;
+        if (done) {
+            document.getElementById("doc1").textContent = r.message;
+            document.getElementById("doc2").textContent = "";
+        } else {
+            document.getElementById("doc1").innerHTML = r.pair[0];
+            document.getElementById("doc2").innerHTML = r.pair[1];
+        }
+        for (const b of document.querySelectorAll("button")) b.disabled = done;
+        const progress = document.getElementById("progress");
+        progress.max = Math.max(1, r.total);
+        progress.value = r.completed;
+    } finally {
+        busy = false;
+    }
+}
+document.getElementById("choose1").onclick = () => judge(0);
+document.getElementById("choose2").onclick = () => judge(1);
+document.addEventListener("keypress", (e) => {
+    switch (e.key.toLowerCase()) {
+        case "f": return judge(0);
+        case "j": return judge(1);
+    }
+});
+window.addEventListener("pagehide", () => navigator.sendBeacon(
+    "api/release",
+    new Blob([JSON.stringify({session})], {type: "application/json"}),
+));
+judge(null);
+</script>
+</body>
+</html>
+"""
@@ -0,0 +1,140 @@
+from attrs import define, field
+import numpy as np
+
+from typing import Iterable
+
+SCALE, BASE, INIT_RATING = 400, 10, 1000
+LN_BASE = np.log(BASE)
+
+
+def _newton_terms(w: np.ndarray, wins: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # gradient and Hessian of the objective minimized by `fit_bt`
+    n = wins.shape[-1]
+    p = 1 / (1 + np.exp(-LN_BASE * (w[..., :, None] - w[..., None, :])))
+    r = wins * (1 - p)
+    grad = w - LN_BASE * (r.sum(-1) - r.sum(-2))
+    c = LN_BASE**2 * wins * p * (1 - p)
+    c += c.swapaxes(-1, -2)
+    hess = np.eye(n) * (c.sum(-1)[..., None] + 1) - c
+    return grad, hess
+
+
+def _objective(w: np.ndarray, wins: np.ndarray) -> np.ndarray:
+    d = LN_BASE * (w[..., :, None] - w[..., None, :])
+    return 0.5 * (w**2).sum(-1) + (wins * np.logaddexp(0, -d)).sum((-1, -2))
+
+
+def fit_bt(
+    wins: np.ndarray,
+    coef: np.ndarray | None = None,
+    tol: float = 1e-8,
+    max_iter: int = 100,
+) -> np.ndarray:
+    # Bradley-Terry fit by Newton's method on pairwise win counts, with the
+    # objective of scikit-learn's `LogisticRegression()` (L2 penalty, C=1)
+    # that MLE_Elo used to fit on one row per match:
+    #   0.5 |w|^2 - sum_ij wins[i, j] * log sigmoid(ln(BASE) * (w_i - w_j))
+    # wins[i, j] is the (weighted) number of times i beat j; leading axes of
+    # `wins` are a batch of independent fits
+    w = np.zeros(wins.shape[:-1]) if coef is None else coef.copy()
+    for _ in range(max_iter):
+        grad, hess = _newton_terms(w, wins)
+        step = np.linalg.solve(hess, grad[..., None])[..., 0]
+        # a full step from a warm start far from the optimum can overshoot
+        # into the flat tails of the sigmoid; halve it until it helps
+        obj = _objective(w, wins)
+        for _ in range(30):
+            worse = _objective(w - step, wins) > obj + 1e-12
+            if not worse.any():
+                break
+            step = np.where(worse[..., None], step / 2, step)
+        w -= step
+        if np.abs(step).max() < tol:
+            break
+    return w
+
+
+def bootstrap_elo(
+    outcomes: list[list[tuple[int, int]]],
+    weights: list[float],
+    nmodel: int,
+    rounds: int = 1000,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    # Elo ratings refitted on `rounds` resamples, of prompts and then of the
+    # (winner, loser) matches within each drawn prompt; all fits are batched
+    rng = rng or np.random.default_rng()
+    nprompt = len(outcomes)
+    prompt_counts = rng.multinomial(nprompt, [1 / nprompt] * nprompt, size=rounds)
+    wins = np.zeros((rounds, nmodel * nmodel))
+    for k, (pairs, weight) in enumerate(zip(outcomes, weights)):
+        if not pairs:
+            continue
+        # drawing a prompt c times draws c * len(pairs) of its matches
+        counts = rng.multinomial(
+            prompt_counts[:, k] * len(pairs), [1 / len(pairs)] * len(pairs)
+        )
+        cells = [i * nmodel + j for i, j in pairs]
+        np.add.at(wins.T, cells, weight * counts.T)
+    return to_elo(fit_bt(wins.reshape(rounds, nmodel, nmodel)))
+
+
+def to_elo(coef: np.ndarray) -> np.ndarray:
+    return SCALE * coef + INIT_RATING
+
+
+@define
+class OnlineElo:
+    # ratings refitted after every outcome, warm-started from the last fit
+    model_names: list[str]
+    wins: np.ndarray = field(init=False)
+    coef: np.ndarray = field(init=False)
+    _idx: dict[str, int] = field(init=False)
+
+    def __attrs_post_init__(self):
+        n = len(self.model_names)
+        self.wins, self.coef = np.zeros((n, n)), np.zeros(n)
+        self._idx = {m: i for i, m in enumerate(self.model_names)}
+
+    def record(self, winner: str, loser: str, weight: float = 1.0):
+        i, j = self._idx[winner], self._idx[loser]
+        if i == j:
+            return
+        self.wins[i, j] += weight
+        self.coef = fit_bt(self.wins, self.coef)
+
+    def ratings(self) -> dict[str, float]:
+        return dict(zip(self.model_names, to_elo(self.coef)))
+
+    def covariance(self) -> np.ndarray:
+        # Laplace approximation of the posterior over `coef`
+        _, hess = _newton_terms(self.coef, self.wins)
+        return np.linalg.inv(hess)
+
+    def ci(self, z: float = 1.96) -> np.ndarray:
+        # half-width of each rating's confidence interval relative to the mean
+        # rating, in Elo points; a common shift of all ratings is only bounded
+        # by the L2 penalty, so it is projected out
+        n = len(self.model_names)
+        center = np.eye(n) - 1 / n
+        cov = center @ self.covariance() @ center
+        return z * SCALE * np.sqrt(np.diag(cov))
+
+    def most_informative(
+        self, exclude: Iterable[tuple[int, int]] = ()
+    ) -> tuple[int, int] | None:
+        # the pair whose outcome is expected to tell the most about the
+        # ratings: 0.5 * log(1 + p(1-p) * Var[ln(BASE) * (w_i - w_j)]);
+        # None if every pair is excluded
+        cov = self.covariance()
+        var = np.diag(cov)[:, None] + np.diag(cov)[None, :] - 2 * cov
+        d = self.coef[:, None] - self.coef[None, :]
+        p = 1 / (1 + np.exp(-LN_BASE * d))
+        gain = np.log1p(LN_BASE**2 * p * (1 - p) * var)
+        np.fill_diagonal(gain, -np.inf)
+        for i, j in exclude:
+            gain[i, j] = gain[j, i] = -np.inf
+        i, j = np.unravel_index(np.argmax(gain), gain.shape)
+        if gain[i, j] == -np.inf:
+            return None
+        return int(i), int(j)
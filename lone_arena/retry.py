@@ -0,0 +1,29 @@
+# pacing of retries on overloaded OpenAI-compatible endpoints, shared by the
+# response generation and the LLM judge
+import random
+
+MAX_ATTEMPTS = 8  # per request, for 429, 5xx and connection errors
+# names in `openai`, looked up once it is imported
+OVERLOAD_ERRORS = ("RateLimitError", "InternalServerError", "APIConnectionError")
+
+
+def overload_errors() -> tuple[type[Exception], ...]:
+    import openai
+
+    return tuple(getattr(openai, e) for e in OVERLOAD_ERRORS)
+
+
+def retry_after(e: Exception) -> float | None:
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    if retry_after is not None:
+        return retry_after
+    return min(60.0, 2.0**attempt) * random.uniform(0.5, 1.0)
@@ -0,0 +1,143 @@
+from .tournament import Player
+
+from attrs import define, field
+
+import asyncio
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+@define
+class Ticket:
+    players: tuple[Player, Player]  # in the order shown
+    future: asyncio.Future
+
+
+@define
+class MatchScheduler:
+    # hands out ready matches to raters' sessions and routes each decision back
+    # to the bracket waiting on it; `compete` runs in the tournament's event
+    # loop, the other methods are called from UI worker threads
+    render: Callable[[Player], str]
+    completed: int = 0
+    total: int = 0
+    message: str = ""  # shown once there are no more matches
+    finished: bool = False
+    cache_size: int = 64  # rendered documents kept
+    prefetch: int = 8  # tickets rendered ahead, at most a quarter of the cache
+    _queue: list[Ticket] = field(init=False, factory=list)
+    _assigned: dict[str, Ticket] = field(init=False, factory=dict)
+    _cond: threading.Condition = field(init=False, factory=threading.Condition)
+    _rendered: OrderedDict = field(init=False, factory=OrderedDict)
+    _render_lock: threading.Lock = field(init=False, factory=threading.Lock)
+    _prefetch: ThreadPoolExecutor = field(
+        init=False, factory=lambda: ThreadPoolExecutor(1)
+    )
+    _prefetch_queued: bool = field(init=False, default=False)
+
+    def rendered(self, player: Player) -> str:
+        with self._render_lock:
+            if player in self._rendered:
+                self._rendered.move_to_end(player)
+                return self._rendered[player]
+        doc = self.render(player)
+        with self._render_lock:
+            self._rendered[player] = doc
+            if len(self._rendered) > self.cache_size:
+                self._rendered.popitem(last=False)
+        return doc
+
+    def docs(self, ticket: Ticket) -> tuple[str, str]:
+        a, b = ticket.players
+        return self.rendered(a), self.rendered(b)
+
+    async def compete(self, a: Player, b: Player) -> tuple[Player, Player]:
+        ticket = Ticket((a, b), asyncio.get_running_loop().create_future())
+        with self._cond:
+            self._enqueue(ticket)
+            self._render_ahead()
+            self._cond.notify()
+        return await ticket.future
+
+    def _enqueue(self, ticket: Ticket):
+        # the queue is in the order tickets are handed out: earliest prompt
+        # first, in random order within a prompt
+        q, prompt = self._queue, _prompt(ticket)
+        if (
+            first := next((i for i, t in enumerate(q) if _prompt(t) == prompt), None)
+        ) is None:
+            q.append(ticket)
+            return
+        last = first
+        while last + 1 < len(q) and _prompt(q[last + 1]) == prompt:
+            last += 1
+        q.insert(random.randint(first, last + 1), ticket)
+
+    def _render_ahead(self):
+        # render the next few tickets, so that the rater's click swaps in a
+        # prepared pair; no further, or they would evict the pairs on screen. Requests
+        # made while one is waiting are merged into it
+        if not self._prefetch_queued:
+            self._prefetch_queued = True
+            self._prefetch.submit(self._render_next)
+
+    def _render_next(self):
+        with self._cond:
+            self._prefetch_queued = False
+            upcoming = self._queue[: min(self.prefetch, self.cache_size // 4)]
+        for ticket in upcoming:
+            self.docs(ticket)
+
+    def _pick(self) -> Ticket:
+        ticket = self._queue.pop(0)
+        self._render_ahead()
+        return ticket
+
+    def next(self, session: str) -> Ticket | None:
+        # blocks until a match is available; None if the evaluation is over
+        with self._cond:
+            if (ticket := self._assigned.get(session)) is not None:
+                return ticket
+            while not self._queue and not self.finished:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            ticket = self._assigned[session] = self._pick()
+            return ticket
+
+    def decide(self, session: str, choice: int) -> bool:
+        with self._cond:
+            ticket = self._assigned.pop(session, None)
+            if ticket is None:
+                return False
+            self.completed += 1
+        a, b = ticket.players
+        outcome = (a, b) if choice == 0 else (b, a)
+        ticket.future.get_loop().call_soon_threadsafe(ticket.future.set_result, outcome)
+        return True
+
+    def skip(self):
+        # count a match decided without a rater
+        with self._cond:
+            self.completed += 1
+
+    def release(self, session: str):
+        # put a session's undecided match back, e.g. when its tab is closed
+        with self._cond:
+            if (ticket := self._assigned.pop(session, None)) is not None:
+                self._queue.insert(0, ticket)
+                self._render_ahead()
+                self._cond.notify()
+
+    def finish(self, message: str):
+        with self._cond:
+            self.message = message
+            self.finished = True
+            self._cond.notify_all()
+
+
+def _prompt(ticket: Ticket) -> str:
+    return ticket.players[0][0]  # type: ignore
@@ -0,0 +1,314 @@
+from .config import Config, load_config
+from .files import DocumentDir, ResultDir, Documents, Messages, is_current
+from .tournament import Podium, Player
+
+from attrs import define, field
+
+from pathlib import Path
+from functools import cached_property
+from collections import OrderedDict
+from collections.abc import Mapping, Iterator
+from typing import Any, Protocol
+import argparse
+import threading
+import hashlib
+import sqlite3
+import json
+
+
+class DocumentStore(Protocol):
+    def load(self, prompt_names: list[str], model_names: list[str]) -> Documents:
+        ...
+
+    def dump(self, msg_list: list[Messages], prompt_name: str, model_name: str):
+        ...
+
+    def append(self, msg: Messages, prompt_name: str, model_name: str):
+        ...
+
+    def count(self, prompt_name: str, model_name: str) -> int:
+        ...
+
+    def repair(self, prompt_name: str, model_name: str):
+        ...
+
+
+class ResultStore(Protocol):
+    @property
+    def location(self) -> str:
+        ...
+
+    def load(
+        self, prompt_names: list[str], model_names: list[str] | None = None
+    ) -> tuple[list[Podium], list[str]]:
+        ...
+
+    def dump(
+        self,
+        podium: Podium,
+        docs: Documents,
+        prompt_name: str,
+        model_names: list[str] | None = None,
+    ):
+        ...
+
+
+def open_stores(conf: Config) -> tuple[DocumentStore, ResultStore]:
+    match conf.store.lower():
+        case "files":
+            return DocumentDir(conf.data_dir), ResultDir(conf.data_dir)
+        case "sqlite":
+            db = SQLiteDB(conf.data_dir / "lone_arena.sqlite")
+            return SQLiteDocuments(db), SQLiteResults(db)
+        case _:
+            raise ValueError(f"unknown store: {conf.store}")
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS response (
+    hash TEXT PRIMARY KEY,
+    chat TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document (
+    prompt TEXT NOT NULL,
+    model TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    hash TEXT NOT NULL REFERENCES response(hash),
+    PRIMARY KEY (prompt, model, idx)
+);
+CREATE TABLE IF NOT EXISTS result (
+    prompt TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    hash TEXT REFERENCES response(hash),
+    PRIMARY KEY (prompt, rank)
+);
+CREATE TABLE IF NOT EXISTS result_models (
+    prompt TEXT PRIMARY KEY,
+    models TEXT NOT NULL
+);
+"""
+
+
+def content_hash(msg: Any) -> str:
+    s = json.dumps(msg, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(s.encode()).hexdigest()
+
+
+@define(slots=False)
+class SQLiteDB:
+    # single-file store; each response is stored once, keyed by content hash
+    path: Path
+    _lock: threading.Lock = field(init=False, factory=threading.Lock)
+
+    @cached_property
+    def conn(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def write(self, statements: list[tuple[str, tuple]]):
+        with self._lock, self.conn:
+            for sql, params in statements:
+                self.conn.execute(sql, params)
+
+    @staticmethod
+    def put_response(msg: Messages) -> tuple[str, tuple]:
+        return (
+            "INSERT OR IGNORE INTO response VALUES (?, ?)",
+            (content_hash(msg), json.dumps(msg, ensure_ascii=False)),
+        )
+
+
+@define(slots=False)
+class SQLiteDocuments:
+    db: SQLiteDB
+
+    def load(self, prompt_names: list[str], model_names: list[str]) -> Documents:
+        return SQLiteMapping(self.db, prompt_names, model_names)
+
+    def dump(self, msg_list: list[Messages], prompt_name: str, model_name: str):
+        statements = [
+            (
+                "DELETE FROM document WHERE prompt = ? AND model = ?",
+                (prompt_name, model_name),
+            )
+        ]
+        for i, msg in enumerate(msg_list):
+            statements += [
+                SQLiteDB.put_response(msg),
+                (
+                    "INSERT INTO document VALUES (?, ?, ?, ?)",
+                    (prompt_name, model_name, i, content_hash(msg)),
+                ),
+            ]
+        self.db.write(statements)
+
+    def append(self, msg: Messages, prompt_name: str, model_name: str):
+        self.db.write(
+            [
+                SQLiteDB.put_response(msg),
+                (
+                    "INSERT INTO document SELECT ?, ?, COALESCE(MAX(idx) + 1, 0), ? "
+                    "FROM document WHERE prompt = ? AND model = ?",
+                    (
+                        prompt_name,
+                        model_name,
+                        content_hash(msg),
+                        prompt_name,
+                        model_name,
+                    ),
+                ),
+            ]
+        )
+
+    def count(self, prompt_name: str, model_name: str) -> int:
+        return self.db.query(
+            "SELECT COUNT(*) FROM document WHERE prompt = ? AND model = ?",
+            (prompt_name, model_name),
+        )[0][0]
+
+    def repair(self, prompt_name: str, model_name: str):
+        pass  # writes are transactions, an interrupted one leaves nothing behind
+
+
+@define(slots=False)
+class SQLiteMapping(Mapping):
+    db: SQLiteDB
+    prompt_names: list[str]
+    model_names: list[str]
+    cache_size: int = 64
+    _cache: OrderedDict = field(init=False, factory=OrderedDict)
+    _lock: threading.Lock = field(init=False, factory=threading.Lock)
+
+    def __getitem__(self, key: Player) -> Messages:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        try:
+            pname, mname, i = key  # type: ignore
+        except (TypeError, ValueError):
+            raise KeyError(key)
+        if pname not in self.prompt_names or mname not in self.model_names:
+            raise KeyError(key)
+        rows = self.db.query(
+            "SELECT chat FROM document JOIN response USING (hash) "
+            "WHERE prompt = ? AND model = ? AND idx = ?",
+            (pname, mname, i),
+        )
+        if not rows:
+            raise KeyError(key)
+        msg = json.loads(rows[0][0])
+        with self._lock:
+            self._cache[key] = msg
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return msg
+
+    def _rows(self) -> list[tuple]:
+        rows = self.db.query("SELECT prompt, model, idx FROM document")
+        pset, mset = set(self.prompt_names), set(self.model_names)
+        return [r for r in rows if r[0] in pset and r[1] in mset]
+
+    def __iter__(self) -> Iterator[Player]:
+        return iter(sorted(self._rows()))
+
+    def __len__(self) -> int:
+        return len(self._rows())
+
+
+@define(slots=False)
+class SQLiteResults:
+    db: SQLiteDB
+
+    @property
+    def location(self) -> str:
+        return f"table `result` of {self.db.path}"
+
+    def load(
+        self, prompt_names: list[str], model_names: list[str] | None = None
+    ) -> tuple[list[Podium], list[str]]:
+        podiums = []
+        pnames_todo = []
+        for pname in prompt_names:
+            rows = self.db.query(
+                "SELECT player FROM result WHERE prompt = ? ORDER BY rank", (pname,)
+            )
+            podium = Podium([tuple(json.loads(r[0])) for r in rows])
+            if rows and is_current(podium, model_names, self.played_models(pname)):
+                podiums.append(podium)
+            else:
+                pnames_todo.append(pname)
+        return podiums, pnames_todo
+
+    def played_models(self, prompt_name: str) -> list[str] | None:
+        rows = self.db.query(
+            "SELECT models FROM result_models WHERE prompt = ?", (prompt_name,)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def dump(
+        self,
+        podium: Podium,
+        docs: Documents,
+        prompt_name: str,
+        model_names: list[str] | None = None,
+    ):
+        statements = [
+            ("DELETE FROM result WHERE prompt = ?", (prompt_name,)),
+            ("DELETE FROM result_models WHERE prompt = ?", (prompt_name,)),
+        ]
+        if model_names is not None:
+            statements.append(
+                (
+                    "INSERT INTO result_models VALUES (?, ?)",
+                    (prompt_name, json.dumps(list(model_names), ensure_ascii=False)),
+                )
+            )
+        for rank, p in enumerate(podium.players):
+            h = None
+            if (msg := docs.get(p)) is not None:
+                statements.append(SQLiteDB.put_response(msg))
+                h = content_hash(msg)
+            statements.append(
+                (
+                    "INSERT INTO result VALUES (?, ?, ?, ?)",
+                    (prompt_name, rank, json.dumps(p, ensure_ascii=False), h),
+                )
+            )
+        self.db.write(statements)
+
+
+def import_files(conf: Config):
+    docsd, resultd = DocumentDir(conf.data_dir), ResultDir(conf.data_dir)
+    sqlite_docs, sqlite_results = open_stores(conf)
+    pnames = [p.name for p in conf.prompt]
+    mnames = [m.name for m in conf.model]
+    docs = docsd.load(pnames, mnames)
+    # only reads complete lines; unlike `docsd.count`, leaves the files as they are
+    msg_lists = {(pname, mname): [] for pname in pnames for mname in mnames}
+    for key in docs:
+        msg_lists[key[:2]].append(docs[key])  # type: ignore
+    for (pname, mname), msg_list in msg_lists.items():
+        sqlite_docs.dump(msg_list, pname, mname)
+    podiums, pnames_todo = resultd.load(pnames)
+    for pname, podium in zip([p for p in pnames if p not in pnames_todo], podiums):
+        sqlite_results.dump(podium, docs, pname, resultd.played_models(pname))
+
+
+if __name__ == "__main__":
+    argp = argparse.ArgumentParser(
+        description="Import responses and results from the file layout into SQLite"
+    )
+    argp.add_argument("config", type=str)
+    args = argp.parse_args()
+    conf = load_config(args.config)
+    conf.store = "sqlite"
+    import_files(conf)
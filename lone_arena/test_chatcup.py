@@ -0,0 +1,138 @@
+from .chatcup import ActiveElo, MLE_Elo, Swiss, Top3_1v1
+from .files import MatchJournal
+from . import compact
+from .rating import OnlineElo
+
+import pytest
+
+import asyncio
+import random
+
+
+def compete(p1, p2):
+    if p1[1:] < p2[1:]:
+        return p2, p1
+    return p1, p2
+
+
+async def acompete(p1, p2):
+    await asyncio.sleep(0)
+    return compete(p1, p2)
+
+
+@pytest.mark.parametrize(
+    "cup",
+    [
+        Top3_1v1(["p1", "p2"], ["a", "b"], 8, (4.8, 3.2, 2.0)),
+        MLE_Elo(["p1", "p2"], ["a", "b", "c"], 8),
+    ],
+)
+def test_arun(cup):
+    async def collect():
+        return [p async for p in cup.arun(acompete)]
+
+    podiums = list(cup.run(compete))
+    assert asyncio.run(collect()) == podiums
+    assert [p.players[0][0] for p in podiums] == ["p1", "p2"]
+
+
+@pytest.mark.parametrize(
+    "cup",
+    [
+        Top3_1v1(["p1", "p2"], ["a", "b"], 8, (4.8, 3.2, 2.0)),
+        MLE_Elo(["p1", "p2"], ["a", "b", "c"], 8),
+        ActiveElo(["p1", "p2"], ["a", "b", "c"], 8, budget=12),
+        Swiss(["p1", "p2"], ["a", "b", "c", "d"], 8),
+    ],
+)
+def test_compact_engine(cup):
+    podiums = list(cup.run(compete, engine=compact))
+    if isinstance(cup, ActiveElo):
+        cup = ActiveElo(["p1", "p2"], ["a", "b", "c"], 8, budget=12)
+    assert podiums == list(cup.run(compete))
+
+
+def test_online_elo_matches_tabulate():
+    cup = MLE_Elo(["p1", "p2", "p3"], ["a", "b", "c"], 8, bootstrap=200)
+    podiums = list(cup.run(lambda p1, p2: random.choice([(p1, p2), (p2, p1)])))
+    weights = [1.0, 2.0, 0.5]
+    elo = OnlineElo(cup.model_names)
+    for podium, weight in zip(podiums, weights):
+        for winner, loser in cup.pairwise_outcomes(podium):
+            elo.record(winner[1], loser[1], weight)
+    result = cup.tabulate_result(podiums, weights).set_index("Prompt")
+    for m, r in elo.ratings().items():
+        assert abs(result.loc["Elo rating", m] - r) <= 1
+        lo, hi = map(float, result.loc["95% CI", m].split("~"))
+        assert lo <= hi
+
+
+def test_active_elo():
+    cup = ActiveElo(["p1", "p2", "p3", "p4"], ["a", "b", "c"], 8, budget=20)
+    podiums = list(cup.run(compete))
+    assert [len(p.players) for p in podiums] == [40] * 4
+    result = cup.tabulate_result(podiums, [1.0] * 4).set_index("Prompt")
+    elo = result.loc["Elo rating"]
+    assert elo["a"] < elo["b"] < elo["c"]
+
+    rng = random.Random(0)
+    strength = {"a": 0.0, "b": 0.5, "c": 1.5}
+
+    def noisy_compete(p1, p2):
+        p = 1 / (1 + 10 ** (strength[p2[1]] - strength[p1[1]]))
+        return (p1, p2) if rng.random() < p else (p2, p1)
+
+    cup = ActiveElo(["p1", "p2", "p3", "p4"], ["a", "b", "c"], 8, budget=100)
+    cup.target_ci = 100
+    podiums = list(cup.run(noisy_compete))
+    played = sum(len(p.players) // 2 for p in podiums)
+    # with 3 x 64 pairs of responses per prompt, only the target stops a
+    # prompt early; once it is reached, later prompts play a single match
+    assert played < cup.budget * 4
+    assert len(podiums[-1].players) // 2 == 1
+    assert cup.nmatch() == played
+    assert cup.ratings.ci().max() <= 100
+
+
+def test_active_elo_distinct_pairs():
+    cup = ActiveElo(["p1"], ["a", "b"], 4, budget=24)
+    (podium,) = cup.run(compete)
+    pairs = {frozenset(o) for o in cup.pairwise_outcomes(podium)}
+    assert len(pairs) == len(podium.players) // 2 == 16  # all 4 x 4 met once
+    assert cup.nmatch() == 16
+
+
+def test_active_elo_resume(tmp_path):
+    expected = list(ActiveElo(["p1", "p2"], ["a", "b", "c"], 4, budget=10).run(compete))
+    calls = []
+
+    def interrupted(p1, p2):
+        if len(calls) == 13:
+            raise KeyboardInterrupt
+        calls.append((p1, p2))
+        return compete(p1, p2)
+
+    cup = ActiveElo(["p1", "p2"], ["a", "b", "c"], 4, budget=10)
+    with pytest.raises(KeyboardInterrupt):
+        list(cup.run(interrupted, journal=MatchJournal(tmp_path)))
+
+    # p1 was completed, p2 is picked up where it stopped
+    journal = MatchJournal(tmp_path)
+    cup = ActiveElo(["p2"], ["a", "b", "c"], 4, budget=10)
+    cup.resume(expected[:1], journal.outcomes(["p2"]))
+    calls.clear()
+    assert list(cup.run(interrupted, journal=journal)) == expected[1:]
+    assert len(calls) == 7 and cup.nmatch() == 10
+
+
+@pytest.mark.parametrize("nmodel", [2, 7, 32])
+def test_swiss(nmodel):
+    models = [f"m{i:02d}" for i in range(nmodel)]
+    cup = Swiss(["p1", "p2", "p3"], models, 8)
+    podiums = list(cup.run(compete))
+    assert sum(len(p.players) for p in podiums) == 2 * cup.nmatch()
+    for podium in podiums:
+        for winner, loser in cup.pairwise_outcomes(podium):
+            assert winner[1] > loser[1] and winner[0] == loser[0]
+    elo = cup.tabulate_result(podiums, [1.0] * 3).set_index("Prompt")
+    assert elo.loc["Elo rating", models[-1]] == elo.loc["Elo rating"].max()
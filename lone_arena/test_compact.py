@@ -0,0 +1,59 @@
+from . import compact, tournament
+
+import pytest
+
+
+def compete(p1, p2):
+    if p1 < p2:
+        return p2, p1
+    return p1, p2
+
+
+@pytest.mark.parametrize("n", [4, 8, 16])
+def test_single_elimination(n):
+    players = [(i * 7) % n for i in range(n)]
+    t, ref = compact.single_elimination(players), tournament.single_elimination(players)
+    assert len(t.init_matches) == len(ref.init_matches)
+    compact.run_tournament(t, compete=compete)
+    tournament.run_tournament(ref, compete=compete)
+    assert t.podium == ref.podium
+
+
+def test_eliminate_half():
+    t = compact.eliminate_half([3, 1, 0, 6, 5, 4, 7, 2])
+    assert len(t.podium.players) == 4
+    compact.run_tournament(t, compete=compete)
+    assert t.podium.players == [3, 6, 5, 7]
+
+
+@pytest.mark.parametrize("case", ["2x3", "4x8", "5x8", "6x8", "6x12"])
+@pytest.mark.parametrize("return_loser", [False, True])
+def test_pair_matches(case, return_loser):
+    mgroup, nplayer = map(int, case.split("x"))
+    players = [[(j, i) for j in range(nplayer)] for i in range(mgroup)]
+    t = compact.pair_matches(players, return_loser=return_loser)
+    ref = tournament.pair_matches(players, return_loser=return_loser)
+    assert [t.players[t.slots[t.match_base[k]]] for k in t.init_matches] == [
+        m.players[0] for m in ref.init_matches
+    ]
+    compact.run_tournament(t, compete=compete)
+    tournament.run_tournament(ref, compete=compete)
+    assert t.podium == ref.podium
+
+
+@pytest.mark.parametrize("return_loser", [False, True])
+def test_fixed_pairs(return_loser):
+    pairs = [(3, 1), (0, 6), (5, 4)]
+    t = compact.fixed_pairs(pairs, return_loser=return_loser)
+    ref = tournament.fixed_pairs(pairs, return_loser=return_loser)
+    compact.run_tournament(t, compete=compete)
+    tournament.run_tournament(ref, compete=compete)
+    assert t.podium == ref.podium
+
+
+def test_run_multiple():
+    ta = compact.eliminate_half(list(range(8)))
+    tb = compact.single_elimination(list(range(10, 18)))
+    compact.run_tournament(ta, tb, compete=compete)
+    assert ta.podium.players == [1, 3, 5, 7]
+    assert tb.podium.players == [17, 13, 15]
@@ -0,0 +1,62 @@
+from .config import Config, Model, Prompt
+from .files import DocumentDir
+
+from evaluate import Arena, ui
+from gradio_client import Client
+
+import socket
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_conf(tmp_path) -> Config:
+    conf = Config(
+        data_dir=tmp_path,
+        mode="mle_elo",
+        sample=4,
+        model=[Model("a"), Model("b")],
+        prompt=[Prompt("p", "user: hi")],
+    )
+    docsd = DocumentDir(tmp_path)
+    for m in ["a", "b"]:
+        msgs = [[{"role": "assistant", "content": f"{m}{i}"}] for i in range(4)]
+        docsd.dump(msgs, "p", m)
+    return conf
+
+
+def test_failed_evaluation(tmp_path):
+    arena = Arena(make_conf(tmp_path), judge_prelim=True)  # without a [judge] model
+    arena.start()
+    assert arena.done.wait(timeout=10)
+    assert isinstance(arena.error, AssertionError)
+    assert arena.scheduler.next("s") is None
+    assert arena.scheduler.message.startswith("Evaluation failed")
+
+
+def test_raters_through_queue(tmp_path):
+    # 4 first-round matches, then 2 final ones that wait on all of them
+    arena = Arena(make_conf(tmp_path))
+    arena.start()
+    demo = ui(arena)
+    port = free_port()
+    demo.launch(server_port=port, prevent_thread_lock=True, quiet=True)
+    try:
+        url = f"http://127.0.0.1:{port}/"
+        ca, cb = Client(url, verbose=False), Client(url, verbose=False)
+        ca.predict(api_name="/init")
+        cb.predict(api_name="/init")
+        ca.predict(api_name="/choose1")
+        cb.predict(api_name="/choose1")
+        # a's next match waits for b's decision, which must not queue behind it
+        for _ in range(2):
+            job = ca.submit(api_name="/choose1")
+            cb.submit(api_name="/choose1").result(timeout=10)
+            job.result(timeout=10)
+        assert arena.done.wait(timeout=10)
+        assert arena.scheduler.completed == 6
+    finally:
+        demo.close()
@@ -0,0 +1,110 @@
+from .files import DocumentDir, CacheDir, MatchJournal, ResultDir
+from .tournament import Podium, single_elimination, run_tournament
+
+import pytest
+
+import os
+
+
+def test_document_append_count(tmp_path):
+    docsd = DocumentDir(tmp_path)
+    assert docsd.count("p", "m") == 0
+    for i in range(3):
+        docsd.append([{"role": "assistant", "content": f"r{i}"}], "p", "m")
+    assert docsd.count("p", "m") == 3
+
+    # interrupted write
+    with (docsd.doc_dir / "p" / "m.jsonl").open("a") as fo:
+        fo.write('[{"role": "assis')
+    path = docsd.doc_dir / "p" / "m.jsonl"
+    size = path.stat().st_size
+    assert docsd.count("p", "m") == 3
+    assert path.stat().st_size == size  # counting leaves the file alone
+    docs = docsd.load(["p"], ["m"])
+    assert docs[("p", "m", 2)] == [{"role": "assistant", "content": "r2"}]
+    docsd.repair("p", "m")
+    docsd.append([{"role": "assistant", "content": "r3"}], "p", "m")
+    assert docsd.count("p", "m") == 4
+    docs = docsd.load(["p"], ["m"])
+    assert docs[("p", "m", 3)] == [{"role": "assistant", "content": "r3"}]
+
+
+def test_cache_evict(tmp_path):
+    cache = CacheDir(tmp_path, "test")
+    keys = [
+        CacheDir.key({"model": "m"}, [{"role": "user", "content": "hi"}], i)
+        for i in range(4)
+    ]
+    assert len(set(keys)) == 4
+    for i, k in enumerate(keys):
+        cache.put(k, "x" * 100)
+        os.utime(cache._path(k), (i, i))
+    assert cache.get(keys[0]) == "x" * 100  # touched, now most recent
+    assert cache.evict(250) == 2
+    assert cache.get(keys[1]) is None and cache.get(keys[2]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[3]) is not None
+
+
+def test_lazy_documents(tmp_path):
+    docsd = DocumentDir(tmp_path)
+    msgs = [[{"role": "assistant", "content": f"r{i}"}] for i in range(5)]
+    for mname in ["m1", "m2"]:
+        docsd.dump(msgs, "p", mname)
+    docs = docsd.load(["p"], ["m1", "m2"])
+    assert len(docs) == 10
+    assert docs[("p", "m2", 4)] == msgs[4]
+    assert ("p", "m1", 5) not in docs and ("q", "m1", 0) not in docs
+    assert docs.get(("p", "m3", 0), []) == []
+    assert (docsd.doc_dir / "p" / "m1.idx").exists()
+
+    # stale index is rebuilt
+    docsd.append(msgs[0], "p", "m1")
+    docs = docsd.load(["p"], ["m1"])
+    assert list(docs) == [("p", "m1", i) for i in range(6)]
+    assert docs[("p", "m1", 5)] == msgs[0]
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_match_journal_resume(tmp_path):
+    players = [("p", "m", i) for i in range(8)]
+    asked, interrupt_at = [], [4]
+
+    def compete(a, b):
+        asked.append((a, b))
+        if len(asked) == interrupt_at[0]:
+            raise Interrupted
+        return (a, b) if a[2] > b[2] else (b, a)
+
+    with pytest.raises(Interrupted):
+        run_tournament(
+            single_elimination(players), compete=compete, journal=MatchJournal(tmp_path)
+        )
+    interrupted = asked[-1]
+
+    asked.clear()
+    interrupt_at[0] = 0
+    t = single_elimination(players)
+    journal = MatchJournal(tmp_path)
+    assert journal.count(["p"]) == 3
+    run_tournament(t, compete=compete, journal=journal)
+    assert asked[0] == interrupted
+    assert len(asked) == 8 - 3
+    assert t.podium.players == [players[7], players[3], players[5]]
+
+
+def test_result_model_change(tmp_path):
+    resultd = ResultDir(tmp_path)
+    podium = Podium([("p1", "a", 0), ("p1", "b", 1)])
+    resultd.dump(podium, None, "p1")  # type: ignore
+    assert resultd.load(["p1", "p2"], ["a", "b"]) == ([podium], ["p2"])
+    assert resultd.load(["p1", "p2"], ["a", "b", "c"]) == ([], ["p1", "p2"])
+    assert resultd.load(["p1"]) == ([podium], [])
+
+    # all of the top 3 from one model, which doesn't mean the other was absent
+    top3 = Podium([("p1", "a", 0), ("p1", "a", 3), ("p1", "a", 2)])
+    resultd.dump(top3, None, "p1", ["a", "b"])  # type: ignore
+    assert resultd.load(["p1"], ["b", "a"]) == ([top3], [])
+    assert resultd.load(["p1"], ["a"]) == ([], ["p1"])
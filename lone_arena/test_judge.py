@@ -0,0 +1,140 @@
+from .chatcup import MLE_Elo
+from .config import Model
+from .files import CacheDir
+from .judge import LLMJudge, VerdictCache
+
+import httpx
+import openai
+import pytest
+
+from types import SimpleNamespace
+import asyncio
+import random
+
+
+class FakeCompletions:
+    # prefers the longer response; the first `overloads` calls get a 429
+    def __init__(self, overloads: int = 0):
+        self.calls = 0
+        self.overloads = overloads
+
+    async def create(self, messages, **params):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.calls <= self.overloads:
+            request = httpx.Request("POST", "http://judge/v1/chat/completions")
+            response = httpx.Response(
+                429, headers={"retry-after": "0"}, request=request
+            )
+            raise openai.RateLimitError("slow down", response=response, body=None)
+        text = messages[-1]["content"]
+        a = text.split("[Response A]\n")[1].split("\n\n[Response B]")[0]
+        b = text.split("[Response B]\n")[1]
+        verdict = "[[A]]" if len(a) > len(b) else "[[B]]"
+        message = SimpleNamespace(content=f"Because. {verdict}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def judge_docs() -> dict:
+    return {
+        ("p", "m", i): [
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "x" * (i + 1)},
+        ]
+        for i in range(4)
+    }
+
+
+def test_llm_judge(tmp_path):
+    docs = judge_docs()
+    completions = FakeCompletions()
+    judge = LLMJudge(Model("judge"), docs)
+    judge.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))  # type: ignore
+    verdicts = VerdictCache(CacheDir(tmp_path, "judge"), docs, judge.context)
+    compete = verdicts.wrap(judge)
+
+    async def main():
+        pairs = [(("p", "m", i), ("p", "m", 3 - i)) for i in range(4)]
+        return await asyncio.gather(*(compete(a, b) for a, b in pairs))
+
+    outcomes = asyncio.run(main())
+    assert [w[2] for w, _ in outcomes] == [3, 2, 2, 3]
+    # asked concurrently, the same pairs wait for the verdicts being asked
+    assert completions.calls == judge.calls == 2
+    assert verdicts.hits == 2
+
+
+@pytest.mark.parametrize("overloads", [2, 8])
+def test_llm_judge_retry(overloads):
+    completions = FakeCompletions(overloads)
+    judge = LLMJudge(Model("judge"), judge_docs())
+    judge.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))  # type: ignore
+    compete = judge(("p", "m", 0), ("p", "m", 1))
+    if overloads < 8:
+        winner, _ = asyncio.run(compete)
+        assert winner == ("p", "m", 1) and judge.retries == overloads
+    else:
+        with pytest.raises(openai.RateLimitError):
+            asyncio.run(compete)
+        assert judge.calls == 8  # MAX_ATTEMPTS
+
+
+def test_verdict_cache(tmp_path):
+    docs = {
+        ("p", m, i): [{"role": "assistant", "content": f"{i}"}]
+        for m in ["old", "new"]
+        for i in range(2)
+    }
+    asked = []
+
+    async def human(a, b):
+        asked.append((a, b))
+        return (a, b) if a[2] > b[2] else (b, a)
+
+    async def main(pairs):
+        verdicts = VerdictCache(CacheDir(tmp_path, "verdict"), docs)
+        compete = verdicts.wrap(human)
+        outcomes = [await compete(a, b) for a, b in pairs]
+        return outcomes, verdicts.hits
+
+    first = [(("p", "old", 0), ("p", "old", 1))]
+    assert asyncio.run(main(first)) == ([(("p", "old", 1), ("p", "old", 0))], 0)
+    # the same responses under another model name, in the other order
+    second = [(("p", "new", 1), ("p", "old", 0)), (("p", "new", 0), ("p", "new", 1))]
+    outcomes, hits = asyncio.run(main(second))
+    assert hits == 2 and len(asked) == 1
+    assert outcomes == [
+        (("p", "new", 1), ("p", "old", 0)),
+        (("p", "new", 1), ("p", "new", 0)),
+    ]
+
+
+def test_verdict_cache_add_model(tmp_path):
+    models = ["m0", "m1", "m2", "m3"]
+    docs = {
+        ("p", m, i): [{"role": "assistant", "content": f"{m} {i}"}]
+        for m in models
+        for i in range(8)
+    }
+    rng = random.Random(0)
+    quality = {p: rng.random() for p in docs}
+    asked = []
+
+    async def human(a, b):
+        asked.append((a, b))
+        return (a, b) if quality[a] > quality[b] else (b, a)
+
+    async def main(model_names):
+        verdicts = VerdictCache(CacheDir(tmp_path, "verdict"), docs)
+        cup = MLE_Elo(["p"], model_names, 8)
+        [_ async for _ in cup.arun(verdicts.wrap(human))]
+        return verdicts.hits
+
+    assert asyncio.run(main(models[:3])) == 0 and len(asked) == 18
+    asked.clear()
+    # the first round within each old model is replayed from the cache, but
+    # the final round pairs the models' winners anew: of its 4 matches between
+    # old models, only 1 is between responses that met before
+    assert asyncio.run(main(models)) == 3 * 4 + 1
+    assert len(asked) == 4 + 4 + 3
+    assert sum("m3" not in (a[1], b[1]) for a, b in asked) == 3
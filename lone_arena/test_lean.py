@@ -0,0 +1,46 @@
+from .lean import lean_app, to_html
+from .scheduler import MatchScheduler
+from .tournament import single_elimination, run_tournament_async
+
+from fastapi.testclient import TestClient
+
+import asyncio
+import threading
+
+
+def test_judge():
+    scheduler = MatchScheduler(render=lambda p: f"**{p[1]}**")  # for gradio
+    t = single_elimination([("a", i) for i in [0, 7, 3, 4, 1, 6, 2, 5]])
+    client = TestClient(lean_app(scheduler, lambda p: str(p[1])))
+    scheduler.total = 8
+
+    async def main():
+        await run_tournament_async(t, compete=scheduler.compete)
+        scheduler.finish("done")
+
+    thread = threading.Thread(target=asyncio.run, args=(main(),))
+    thread.start()
+    r = client.post("/api/judge", json={"session": "s"}).json()
+    while r["pair"] is not None:
+        a, b = map(int, r["pair"])
+        r = client.post("/api/judge", json={"session": "s", "choice": int(b > a)})
+        r = r.json()
+    thread.join()
+    assert r["message"] == "done" and r["completed"] == 8
+    assert [p[1] for p in t.podium.players] == [7, 6, 5]
+    assert "api/judge" in client.get("/").text
+
+
+def test_to_html_escapes():
+    conv = [
+        {"role": "user", "content": "hi <b>there</b>"},
+        {
+            "role": "assistant",
+            "content": "<img src=x onerror=alert(1)> **ok**\n"
+            "[link](javascript:alert(1))",
+        },
+    ]
+    html = to_html(conv)
+    assert "<img" not in html and "&lt;img" in html
+    assert "<b>there</b>" not in html and "<strong>ok</strong>" in html
+    assert "href" not in html
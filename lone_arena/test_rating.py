@@ -0,0 +1,77 @@
+from .rating import fit_bt, bootstrap_elo, to_elo, OnlineElo, LN_BASE
+
+import numpy as np
+import pytest
+
+
+def random_outcomes(rng, nmodel=4, nmatch=60):
+    strength = rng.normal(size=nmodel)
+    outcomes = []
+    for _ in range(nmatch):
+        i, j = rng.choice(nmodel, 2, replace=False)
+        p = 1 / (1 + np.exp(strength[j] - strength[i]))
+        outcomes.append((i, j) if rng.random() < p else (j, i))
+    return outcomes
+
+
+def test_fit_bt():
+    linear_model = pytest.importorskip("sklearn.linear_model")
+    rng = np.random.default_rng(0)
+    outcomes = random_outcomes(rng)
+    weights = rng.uniform(0.5, 2, len(outcomes))
+    wins = np.zeros((4, 4))
+    x = np.zeros((len(outcomes), 4))
+    for k, (i, j) in enumerate(outcomes):
+        wins[i, j] += weights[k]
+        x[k, i], x[k, j] = LN_BASE, -LN_BASE
+    x[::2] *= -1  # half of the rows as losses
+    y = np.arange(len(outcomes)) % 2
+    lr = linear_model.LogisticRegression(fit_intercept=False, tol=1e-8)
+    lr.fit(x, y, sample_weight=weights)
+    assert np.allclose(to_elo(fit_bt(wins)), to_elo(lr.coef_[0]), atol=0.01)
+
+
+def test_online_elo():
+    rng = np.random.default_rng(1)
+    names = ["a", "b", "c", "d"]
+    elo = OnlineElo(names)
+    wins = np.zeros((4, 4))
+    for i, j in random_outcomes(rng):
+        elo.record(names[i], names[j])
+        wins[i, j] += 1
+    elo.record("a", "a")  # same model, ignored
+    expected = to_elo(fit_bt(wins))
+    assert np.allclose(list(elo.ratings().values()), expected)
+
+
+def test_online_elo_warm_start():
+    # a full Newton step from the last fit used to diverge on this sequence
+    outcomes = (
+        "ac1 ba2 ac1 bc1 cb2 ca.5 ac2 ca2 ab1 ba1 ca.5 ab1 ba1 cb1 ab2 cb1 cb.5 ca1"
+    )
+    elo = OnlineElo(["a", "b", "c"])
+    for o in outcomes.split():
+        elo.record(o[0], o[1], float(o[2:]))
+    assert np.allclose(elo.coef, fit_bt(elo.wins))
+
+
+def test_fit_bt_batch():
+    rng = np.random.default_rng(2)
+    wins = rng.integers(0, 5, (10, 3, 3)).astype(float)
+    batch = fit_bt(wins)
+    for b in range(10):
+        assert np.allclose(batch[b], fit_bt(wins[b]))
+
+
+def test_bootstrap_elo():
+    rng = np.random.default_rng(3)
+    outcomes = [random_outcomes(rng, nmatch=12) for _ in range(10)]
+    samples = bootstrap_elo(outcomes, [1.0] * 10, 4, rounds=500, rng=rng)
+    assert samples.shape == (500, 4)
+    wins = np.zeros((4, 4))
+    for pairs in outcomes:
+        for i, j in pairs:
+            wins[i, j] += 1
+    lo, hi = np.percentile(samples, [2.5, 97.5], axis=0)
+    point = to_elo(fit_bt(wins))
+    assert np.all(lo < point) and np.all(point < hi)
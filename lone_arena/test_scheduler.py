@@ -0,0 +1,116 @@
+from .scheduler import MatchScheduler
+from .tournament import single_elimination, run_tournament_async
+
+import asyncio
+import threading
+
+
+def rater(scheduler: MatchScheduler, session: str, decided: list):
+    while (ticket := scheduler.next(session)) is not None:
+        a, b = ticket.players
+        scheduler.decide(session, 0 if a[1] > b[1] else 1)
+        decided.append(session)
+
+
+def drain(scheduler: MatchScheduler):
+    # wait for the documents being rendered ahead
+    scheduler._prefetch.submit(lambda: None).result()
+
+
+def test_multiple_raters():
+    scheduler = MatchScheduler(render=str)
+    ta = single_elimination([("a", i) for i in [0, 7, 3, 4, 1, 6, 2, 5]])
+    tb = single_elimination([("b", i) for i in [3, 1, 2, 0]])
+
+    async def main():
+        await run_tournament_async(ta, tb, compete=scheduler.compete)
+        scheduler.finish("done")
+
+    decided = []
+    raters = [
+        threading.Thread(target=rater, args=(scheduler, f"s{i}", decided))
+        for i in range(3)
+    ]
+    for t in raters:
+        t.start()
+    asyncio.run(main())
+    for t in raters:
+        t.join()
+    assert [p[1] for p in ta.podium.players] == [7, 6, 5]
+    assert [p[1] for p in tb.podium.players] == [3, 2, 1]
+    assert len(decided) == scheduler.completed == 8 + 4
+
+
+def test_release():
+    scheduler = MatchScheduler(render=str)
+
+    async def main():
+        task = asyncio.create_task(scheduler.compete(("p", 0), ("p", 1)))
+        await asyncio.sleep(0)
+        ticket = await asyncio.to_thread(scheduler.next, "s1")
+        assert await asyncio.to_thread(scheduler.next, "s1") is ticket  # reload
+        scheduler.release("s1")
+        assert not scheduler.decide("s1", 0)
+        assert await asyncio.to_thread(scheduler.next, "s2") is ticket
+        scheduler.decide("s2", 1)
+        return await task, ticket
+
+    (winner, _), ticket = asyncio.run(main())
+    assert winner == ticket.players[1]
+    assert scheduler.docs(ticket) == tuple(map(str, ticket.players))
+
+
+def test_prefetch():
+    rendered = []
+
+    def render(p):
+        rendered.append(p)
+        return str(p)
+
+    scheduler = MatchScheduler(render=render, cache_size=8)
+    t = single_elimination([("a", i) for i in [0, 7, 3, 4, 1, 6, 2, 5]])
+
+    async def main():
+        task = asyncio.create_task(run_tournament_async(t, compete=scheduler.compete))
+        while len(scheduler._queue) < 4:
+            await asyncio.sleep(0.01)
+        await asyncio.to_thread(drain, scheduler)
+        assert len(rendered) <= 8
+        ticket = await asyncio.to_thread(scheduler.next, "s1")
+        await asyncio.to_thread(drain, scheduler)
+        n = len(rendered)
+        scheduler.docs(ticket)
+        assert len(rendered) == n  # already rendered
+        task.cancel()
+
+    asyncio.run(main())
+    for i in range(8):
+        scheduler.rendered(("b", i))
+    assert len(scheduler._rendered) == 8
+
+
+def test_prefetch_ahead():
+    rendered = []
+
+    def render(p):
+        rendered.append(p)
+        return str(p)
+
+    scheduler = MatchScheduler(render=render, cache_size=16)
+    ts = [single_elimination([(f"p{j}", i) for i in range(16)]) for j in range(4)]
+
+    async def main():
+        task = asyncio.create_task(run_tournament_async(*ts, compete=scheduler.compete))
+        while len(scheduler._queue) < 32:
+            await asyncio.sleep(0.01)
+        await asyncio.to_thread(drain, scheduler)
+        assert len(rendered) < 32  # not all 64 documents up front
+        for i in range(3):
+            ticket = await asyncio.to_thread(scheduler.next, f"s{i}")
+            await asyncio.to_thread(drain, scheduler)
+            n = len(rendered)
+            scheduler.docs(ticket)
+            assert len(rendered) == n  # rendered ahead, and still cached
+        task.cancel()
+
+    asyncio.run(main())
@@ -0,0 +1,22 @@
+from simulate import Design, simulate, spearman
+
+
+def test_spearman():
+    assert spearman([1.0, 5.0, 2.0], [10.0, 30.0, 20.0]) == 1.0
+    assert spearman([3.0, 2.0, 2.0], [1.0, 2.0, 3.0]) < 0
+    assert spearman([1.0, 1.0, 1.0], [1.0, 2.0, 3.0]) == 0.0
+
+
+def test_simulate():
+    world = {"sample_sd": 50.0, "lapse": 0.0}
+    for design, nmodel in [
+        (Design("top3_1v1", 8), 2),
+        (Design("mle_elo", 8), 4),
+        (Design("active_elo", 4, budget=12), 4),
+        (Design("swiss", 4), 4),
+    ]:
+        r = simulate(design, nmodel, 3, 400.0, world, seed=1)
+        assert r["matches"] > 0
+        assert 0 <= r["top1"] <= 1 and -1 <= r["spearman"] <= 1
+    r = simulate(Design("mle_elo", 8), 4, 8, 1000.0, world, seed=1)
+    assert r["top1"] == 1 and r["spearman"] > 0.7
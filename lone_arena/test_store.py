@@ -0,0 +1,53 @@
+from .config import Config, Model, Prompt
+from .files import DocumentDir
+from .store import SQLiteDB, SQLiteDocuments, SQLiteResults, import_files, open_stores
+from .tournament import Podium
+
+
+def test_sqlite_store(tmp_path):
+    db = SQLiteDB(tmp_path / "test.sqlite")
+    docsd, resultd = SQLiteDocuments(db), SQLiteResults(db)
+    msgs = [[{"role": "assistant", "content": f"r{i % 2}"}] for i in range(4)]
+    docsd.dump(msgs[:2], "p", "m1")
+    for msg in msgs:
+        docsd.append(msg, "p", "m2")
+    assert docsd.count("p", "m1") == 2 and docsd.count("p", "m2") == 4
+    assert db.query("SELECT COUNT(*) FROM response")[0][0] == 2  # deduplicated
+
+    docs = docsd.load(["p"], ["m1", "m2"])
+    assert len(docs) == 6
+    assert docs[("p", "m2", 3)] == msgs[3]
+    assert ("p", "m1", 2) not in docs
+
+    podium = Podium([("p", "m2", 1), ("p", "m1", 0)])
+    resultd.dump(podium, docs, "p")
+    podiums, pnames_todo = resultd.load(["p", "q"])
+    assert podiums == [podium] and pnames_todo == ["q"]
+    assert db.query("SELECT COUNT(*) FROM response")[0][0] == 2
+    assert resultd.load(["p"], ["m1", "m2"]) == ([podium], [])
+
+    top3 = Podium([("p", "m2", 1), ("p", "m2", 0), ("p", "m2", 3)])
+    resultd.dump(top3, docs, "p", ["m1", "m2"])
+    assert resultd.load(["p"], ["m1", "m2"]) == ([top3], [])
+    assert resultd.load(["p"], ["m1", "m2", "m3"]) == ([], ["p"])
+
+
+def test_import_files(tmp_path):
+    conf = Config(
+        data_dir=tmp_path,
+        model=[Model("m1"), Model("m2")],
+        prompt=[Prompt("p", "user: hi")],
+    )
+    docsd = DocumentDir(tmp_path)
+    docsd.dump([[{"role": "assistant", "content": "a"}]], "p", "m1")
+    docsd.dump([], "p", "m2")
+    path = docsd.doc_dir / "p" / "m1.jsonl"
+    with path.open("a") as fo:
+        fo.write('[{"role": "assistant", "con')  # interrupted write
+    before = path.read_bytes()
+
+    conf.store = "sqlite"
+    import_files(conf)
+    assert path.read_bytes() == before
+    sqlite_docs, _ = open_stores(conf)
+    assert sqlite_docs.count("p", "m1") == 1 and sqlite_docs.count("p", "m2") == 0
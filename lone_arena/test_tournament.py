@@ -3,6 +3,8 @@ from .tournament import *
 import pytest
 
 from itertools import combinations
+import asyncio
+import random
 from typing import cast
 
 
@@ -60,3 +62,86 @@ def test_run_tournament():
     t = single_elimination([0, 7, 3, 4, 1, 6, 2, 5])
     run_tournament(t, compete=compete)
     assert t.podium.players == [7, 6, 5]
+
+
+def test_run_tournament_async():
+    inflight, max_inflight = 0, 0
+
+    async def compete(p1, p2):
+        nonlocal inflight, max_inflight
+        inflight += 1
+        max_inflight = max(max_inflight, inflight)
+        await asyncio.sleep(random.random() / 100)
+        inflight -= 1
+        if p1 < p2:
+            return p2, p1
+        return p1, p2
+
+    ta = single_elimination([0, 7, 3, 4, 1, 6, 2, 5])
+    tb = eliminate_half(list(range(10, 18)))
+    asyncio.run(run_tournament_async(ta, tb, compete=compete))
+    assert ta.podium.players == [7, 6, 5]
+    assert tb.podium.players == [11, 13, 15, 17]
+    assert max_inflight == 8
+
+
+def test_run_tournament_async_error():
+    cancelled = 0
+
+    async def compete(p1, p2):
+        nonlocal cancelled
+        if 0 in (p1, p2):
+            raise ValueError("rater gone")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+        return p1, p2
+
+    async def main():
+        t = eliminate_half(list(range(8)))
+        with pytest.raises(ValueError):
+            await run_tournament_async(t, compete=compete)
+        await asyncio.sleep(0)  # let the cancellations through
+        return cancelled
+
+    assert asyncio.run(main()) == 3
+
+
+def test_run_tournament_async_error_journals_done():
+    recorded = []
+
+    class Journal:
+        def lookup(self, a, b):
+            return None
+
+        def pending(self, a, b):
+            return None
+
+        def ask(self, a, b):
+            pass
+
+        def record(self, winner, loser):
+            recorded.append((winner, loser))
+
+    gate = asyncio.Event()
+
+    async def compete(p1, p2):
+        await gate.wait()  # all four decisions come in together
+        if 0 in (p1, p2):
+            raise ValueError("rater gone")
+        return (p1, p2) if p1 > p2 else (p2, p1)
+
+    async def main():
+        t = eliminate_half(list(range(8)))
+        task = asyncio.create_task(
+            run_tournament_async(t, compete=compete, journal=Journal())
+        )
+        await asyncio.sleep(0)
+        gate.set()
+        with pytest.raises(ValueError):
+            await task
+
+    asyncio.run(main())
+    assert sorted(w for w, _ in recorded) == [3, 5, 7]
@@ -2,12 +2,15 @@ from attrs import define, Factory, NOTHING as TBD
 
 from math import log2
 from itertools import chain, batched
+from functools import partial
+import asyncio
+import inspect
 import random
 from pathlib import Path
 import json
 from itertools import combinations
-from typing import Self, Callable, Protocol
-from collections.abc import Hashable
+from typing import Self, Callable, Awaitable, Protocol
+from collections.abc import Hashable, Iterable, Mapping
 
 type Player = Hashable
 
@@ -16,6 +19,21 @@ class PlayerBox(Protocol):
     players: list[Player]
 
 
+class Journal(Protocol):
+    # decisions made so far, to rebuild brackets after a restart
+    def lookup(self, a: Player, b: Player) -> tuple[Player, Player] | None:
+        ...
+
+    def pending(self, a: Player, b: Player) -> tuple[Player, Player] | None:
+        ...
+
+    def ask(self, a: Player, b: Player):
+        ...
+
+    def record(self, winner: Player, loser: Player):
+        ...
+
+
 @define
 class Match:
     winner_to: tuple[PlayerBox, int] | None = None
@@ -48,7 +66,7 @@ class Podium:
     def for_(cls, n: int) -> Self:
         return cls(players=[TBD] * n)
 
-    def dump(self, path: Path, docs: dict[Player, list] | None = None):
+    def dump(self, path: Path, docs: Mapping[Player, list] | None = None):
         if docs is None:
             d = [{"id": p} for p in self.players]
         else:
@@ -70,13 +88,108 @@ class Tournament:
 def run_tournament(
     *tournaments: Tournament,
     compete: Callable[[Player, Player], tuple[Player, Player]],
+    journal: Journal | None = None,
 ):
-    pool = list(chain.from_iterable(t.init_matches for t in tournaments))
+    pool = ReadyMatches(journal)
+    pool.extend(chain.from_iterable(t.init_matches for t in tournaments))
     while pool:
-        m = pool.pop(random.randrange(len(pool)))
-        random.shuffle(m.players)
-        winner, loser = compete(*m.players)
-        pool.extend(m.moveon(winner, loser))
+        m, outcome = pool.pop()
+        if outcome is None:
+            if journal is not None and (shown := journal.pending(*m.players)):
+                m.players = list(shown)  # in the order shown before the restart
+            else:
+                random.shuffle(m.players)
+            if journal is not None:
+                journal.ask(*m.players)
+            outcome = compete(*m.players)
+            if journal is not None:
+                journal.record(*outcome)
+        pool.extend(m.moveon(*outcome))
+
+
+async def run_tournament_async(
+    *tournaments: Tournament,
+    compete: Callable[[Player, Player], Awaitable[tuple[Player, Player]]]
+    | Callable[[Player, Player], tuple[Player, Player]],
+    journal: Journal | None = None,
+):
+    # like `run_tournament`, but all ready matches are dispatched at once;
+    # a synchronous `compete` is run in worker threads
+    if not inspect.iscoroutinefunction(compete):
+        compete = partial(asyncio.to_thread, compete)
+    pool = ReadyMatches(journal)
+    pool.extend(chain.from_iterable(t.init_matches for t in tournaments))
+    running: dict[asyncio.Future, Match] = {}
+    try:
+        while pool or running:
+            while pool:
+                m, outcome = pool.pop()
+                if outcome is not None:
+                    pool.extend(m.moveon(*outcome))
+                    continue
+                if journal is not None and (shown := journal.pending(*m.players)):
+                    m.players = list(shown)  # in the order shown before the restart
+                else:
+                    random.shuffle(m.players)
+                if journal is not None:
+                    journal.ask(*m.players)
+                running[asyncio.ensure_future(compete(*m.players))] = m
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            # journal every decision that came in before raising a failed one
+            failed = None
+            for fut in done:
+                m = running.pop(fut)
+                if (e := fut.exception()) is not None:
+                    failed = failed or e
+                    continue
+                outcome = fut.result()
+                if journal is not None:
+                    journal.record(*outcome)
+                pool.extend(m.moveon(*outcome))
+            if failed is not None:
+                raise failed
+    finally:
+        # on an error or cancellation, cancel the matches being decided; a
+        # synchronous `compete` already running in a worker thread can't be
+        # stopped, and its decision is dropped
+        for fut in running:
+            fut.cancel()
+
+
+@define
+class ReadyMatches:
+    # matches with both players known; journaled decisions are replayed first,
+    # then the match left pending, then the rest in random order. Each match is
+    # looked up in the journal once, when it becomes ready
+    journal: Journal | None = None
+    replay: list[tuple[Match, tuple[Player, Player]]] = Factory(list)
+    pending: list[Match] = Factory(list)
+    fresh: list[Match] = Factory(list)
+
+    def __bool__(self) -> bool:
+        return bool(self.replay or self.pending or self.fresh)
+
+    def extend(self, matches: Iterable[Match]):
+        for m in matches:
+            if self.journal is None:
+                self.fresh.append(m)
+            elif (outcome := self.journal.lookup(*m.players)) is not None:
+                self.replay.append((m, outcome))
+            elif self.journal.pending(*m.players) is not None:
+                self.pending.append(m)
+            else:
+                self.fresh.append(m)
+
+    def pop(self) -> tuple[Match, tuple[Player, Player] | None]:
+        if self.replay:
+            return self.replay.pop()
+        if self.pending:
+            return self.pending.pop(), None
+        i = random.randrange(len(self.fresh))
+        self.fresh[i], self.fresh[-1] = self.fresh[-1], self.fresh[i]
+        return self.fresh.pop(), None
 
 
 def single_elimination(players: list[Player]) -> Tournament:
@@ -150,3 +263,15 @@ def pair_matches(
         i, j = (i + 1) % mgroup, (j + 1) % mgroup
 
     return Tournament(matches, p)
+
+
+def fixed_pairs(
+    pairs: list[tuple[Player, Player]], *, return_loser: bool = False
+) -> Tournament:
+    n_match = len(pairs)
+    p = Podium.for_(n_match * 2 if return_loser else n_match)
+    matches = [
+        Match((p, i), (p, i + n_match) if return_loser else None, list(pair))
+        for i, pair in enumerate(pairs)
+    ]
+    return Tournament(matches, p)
@@ -0,0 +1,199 @@
+from lone_arena import compact
+from lone_arena.chatcup import cup_factory, Top3_1v1
+from lone_arena.config import Config, Model, Prompt
+from lone_arena.tournament import Player
+
+from attrs import define, field, asdict
+
+import argparse
+import json
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+
+@define
+class Design:
+    mode: str
+    sample: int
+    top3_scores: tuple[float, float, float] = (4.8, 3.2, 2.0)
+    budget: int = 0
+    target_ci: float = 0.0
+    rounds: int = 0
+
+    def __str__(self) -> str:
+        s = f"{self.mode} sample={self.sample}"
+        if self.mode == "top3_1v1":
+            s += f" top3_scores={','.join(f'{x:g}' for x in self.top3_scores)}"
+        return s
+
+
+@define
+class World:
+    # hidden Elo strength of each model; each response is off from its model's
+    # strength by `sample_sd`, and raters pick at random with rate `lapse`
+    strengths: dict[str, float]
+    sample_sd: float
+    lapse: float
+    rng: random.Random
+    quality: dict[Player, float] = field(factory=dict)
+    matches: int = 0
+
+    def _quality(self, p: Player) -> float:
+        if (q := self.quality.get(p)) is None:
+            q = self.quality[p] = self.rng.gauss(self.strengths[p[1]], self.sample_sd)  # type: ignore
+        return q
+
+    def __call__(self, a: Player, b: Player) -> tuple[Player, Player]:
+        self.matches += 1
+        if self.rng.random() < self.lapse:
+            return (a, b) if self.rng.random() < 0.5 else (b, a)
+        p = 1 / (1 + 10 ** ((self._quality(b) - self._quality(a)) / 400))
+        return (a, b) if self.rng.random() < p else (b, a)
+
+
+def spearman(x: list[float], y: list[float]) -> float:
+    import pandas as pd
+
+    # Pearson correlation of the ranks; pandas' method="spearman" needs scipy
+    r = pd.Series(x).rank().corr(pd.Series(y).rank())
+    return 0.0 if r != r else float(r)  # NaN when all estimates tie
+
+
+def simulate(
+    design: Design, nmodel: int, nprompt: int, spread: float, world: dict, seed: int
+) -> dict:
+    rng = random.Random(seed)
+    random.seed(seed)  # for bracket shuffles
+    mnames = [f"m{i}" for i in range(nmodel)]
+    strengths = {m: rng.gauss(0, spread) for m in mnames}
+    conf = Config(
+        model=[Model(m) for m in mnames],
+        prompt=[Prompt(f"p{i}", "") for i in range(nprompt)],
+        **asdict(design),
+    )
+    pnames = [p.name for p in conf.prompt]
+    cup = cup_factory(pnames, mnames, conf)
+    compete = World(strengths, rng=rng, **world)
+    podiums = list(cup.run(compete, engine=compact))
+    result = cup.tabulate_result(podiums, [1.0] * nprompt).set_index("Prompt")
+    row = "TOTAL" if isinstance(cup, Top3_1v1) else "Elo rating"
+    estimate = [float(result.loc[row, m]) for m in mnames]
+    truth = [strengths[m] for m in mnames]
+    best = max(estimate)
+    # ties for first count as a fraction of a hit
+    top = [i for i, e in enumerate(estimate) if e == best]
+    return {
+        "matches": compete.matches,
+        "spearman": spearman(estimate, truth),
+        "top1": (truth.index(max(truth)) in top) / len(top),
+    }
+
+
+def run_design(args: tuple) -> dict:
+    return simulate(*args)
+
+
+def main():
+    argp = argparse.ArgumentParser(
+        description="Compare evaluation designs on simulated raters: ranking accuracy "
+        "versus number of matches"
+    )
+    argp.add_argument("--models", type=int, default=2)
+    argp.add_argument("--prompts", type=int, default=10)
+    argp.add_argument(
+        "--modes",
+        type=str,
+        default=None,
+        help="comma-separated (default: top3_1v1,mle_elo for 2 models, "
+        "mle_elo,active_elo,swiss otherwise)",
+    )
+    argp.add_argument("--samples", type=str, default="4,8,16")
+    argp.add_argument(
+        "--top3-scores",
+        type=str,
+        default="4.8,3.2,2.0",
+        help="for top3_1v1, several separated by ';'",
+    )
+    argp.add_argument("--budget", type=int, default=0, help="for active_elo")
+    argp.add_argument("--target-ci", type=float, default=0.0, help="for active_elo")
+    argp.add_argument("--rounds", type=int, default=0, help="for swiss")
+    argp.add_argument(
+        "--spread", type=float, default=100.0, help="sd of true model Elo"
+    )
+    argp.add_argument(
+        "--sample-sd", type=float, default=100.0, help="sd of response Elo in a model"
+    )
+    argp.add_argument(
+        "--lapse", type=float, default=0.1, help="rate of random rater decisions"
+    )
+    argp.add_argument("--reps", type=int, default=1000)
+    argp.add_argument("--workers", type=int, default=None)
+    argp.add_argument("--seed", type=int, default=0)
+    argp.add_argument(
+        "--target", type=float, default=0.9, help="top-1 accuracy to meet"
+    )
+    argp.add_argument("--output", type=str, help="save results as JSON")
+    args = argp.parse_args()
+
+    modes = args.modes or (
+        "top3_1v1,mle_elo" if args.models == 2 else "mle_elo,active_elo,swiss"
+    )
+    designs = []
+    for mode, sample in product(modes.split(","), map(int, args.samples.split(","))):
+        if mode == "top3_1v1":
+            assert args.models == 2, "top3_1v1 needs --models 2"
+            scores_list = [
+                tuple(map(float, s.split(","))) for s in args.top3_scores.split(";")
+            ]
+        else:
+            scores_list = [(4.8, 3.2, 2.0)]
+        for scores in scores_list:
+            designs.append(
+                Design(
+                    mode,
+                    sample,
+                    scores,  # type: ignore
+                    args.budget,
+                    args.target_ci,
+                    args.rounds,
+                )
+            )
+
+    world = {"sample_sd": args.sample_sd, "lapse": args.lapse}
+    results = []
+    with ProcessPoolExecutor(args.workers) as pool:
+        for d, design in enumerate(designs):
+            tasks = [
+                (design, args.models, args.prompts, args.spread, world, seed)
+                for seed in range(args.seed, args.seed + args.reps)
+            ]
+            runs = list(pool.map(run_design, tasks, chunksize=max(1, args.reps // 64)))
+            r = {
+                "design": str(design),
+                **asdict(design),
+                "matches": sum(x["matches"] for x in runs) / len(runs),
+                "spearman": sum(x["spearman"] for x in runs) / len(runs),
+                "top1": sum(x["top1"] for x in runs) / len(runs),
+            }
+            results.append(r)
+            print(
+                f"{r['design']:<48} {r['matches']:>8.1f} matches, "
+                f"top-1 {r['top1']:.3f}, spearman {r['spearman']:.3f}"
+            )
+
+    if ok := [r for r in results if r["top1"] >= args.target]:
+        cheapest = min(ok, key=lambda r: r["matches"])
+        print(
+            f"cheapest design with top-1 accuracy >= {args.target}: "
+            f"{cheapest['design']} ({cheapest['matches']:.0f} matches)"
+        )
+    else:
+        print(f"no design reaches top-1 accuracy {args.target}")
+    if args.output:
+        with open(args.output, "w") as fo:
+            json.dump({"params": vars(args), "results": results}, fo, indent=2)
+
+
+if __name__ == "__main__":
+    main()